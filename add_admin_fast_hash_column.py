@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+为 admin 表添加 password_fast_hash 列
+
+配置 PASSWORD_PEPPER 后，登录/Basic Auth 优先用 HMAC-SHA256 快路径验证密码，
+此列存储 HMAC-SHA256(pepper, password)。首次 bcrypt 验证成功时会自动补写。
+
+使用方法：
+    python add_admin_fast_hash_column.py
+"""
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def add_admin_fast_hash_column():
+    """添加 password_fast_hash 列（如果不存在）"""
+    engine = create_engine(settings.DATABASE_URL)
+
+    try:
+        with engine.connect() as conn:
+            print("正在添加 admin.password_fast_hash 列 ...")
+            conn.execute(text("""
+                ALTER TABLE admin
+                ADD COLUMN IF NOT EXISTS password_fast_hash VARCHAR
+            """))
+            conn.commit()
+            print("✅ 列添加成功（或已存在）")
+    except Exception as e:
+        print(f"❌ 错误：{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    add_admin_fast_hash_column()
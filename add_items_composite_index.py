@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+为 items 表添加组合索引 (warehouse_id, category_id)
+
+get_items / create_item 同时按仓库和品类过滤，单列索引只能命中一个条件，
+组合索引可以让查询变成一次索引范围扫描。
+
+使用方法：
+    python add_items_composite_index.py
+
+注意：
+- 使用 CREATE INDEX CONCURRENTLY，不会阻塞线上写入
+"""
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def add_items_composite_index():
+    """创建组合索引（如果不存在）"""
+    engine = create_engine(settings.DATABASE_URL)
+
+    try:
+        # CONCURRENTLY 不能在事务块内执行，需要 autocommit 连接
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            print("正在创建组合索引 ix_items_wh_cat ...")
+            conn.execute(text("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_items_wh_cat
+                ON items (warehouse_id, category_id)
+            """))
+            print("✅ 索引创建成功（或已存在）")
+    except Exception as e:
+        print(f"❌ 错误：{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    add_items_composite_index()
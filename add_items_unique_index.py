@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+为 items 表添加唯一索引 (warehouse_id, category_id, md5(specs::text))
+
+create_item 的 UPSERT（INSERT ... ON CONFLICT）依赖此索引来判断
+"同仓库、同品类、同规格" 的物品冲突。
+
+使用方法：
+    python add_items_unique_index.py
+
+注意：
+- 如果现有数据中存在重复的 (仓库, 品类, 规格) 组合，索引创建会失败，
+  需要先手动合并重复行
+"""
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def add_items_unique_index():
+    """创建唯一索引（如果不存在）"""
+    engine = create_engine(settings.DATABASE_URL)
+
+    try:
+        with engine.connect() as conn:
+            print("正在创建唯一索引 uq_items_wh_cat_specs ...")
+            conn.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_items_wh_cat_specs
+                ON items (warehouse_id, category_id, md5(specs::text))
+            """))
+            conn.commit()
+            print("✅ 索引创建成功（或已存在）")
+    except Exception as e:
+        print(f"❌ 错误：{e}")
+        print("如果存在重复的 (仓库, 品类, 规格) 数据，请先合并重复行后重试")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    add_items_unique_index()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+为 transactions 表添加 (warehouse_id, date DESC) / (related_warehouse_id, date DESC) 组合索引
+
+get_transactions 按仓库（本仓或调拨对端）过滤并按 date DESC 分页，
+这两个索引让查询变成两次索引范围扫描（配合 UNION ALL 改写），
+避免大表上的顺序扫描 + 排序。
+
+使用方法：
+    python add_transactions_date_indexes.py
+
+注意：
+- 使用 CREATE INDEX CONCURRENTLY，不会阻塞线上写入
+"""
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def add_transactions_date_indexes():
+    """创建组合索引（如果不存在）"""
+    engine = create_engine(settings.DATABASE_URL)
+
+    try:
+        # CONCURRENTLY 不能在事务块内执行，需要 autocommit 连接
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            print("正在创建组合索引 ix_tx_wh_date ...")
+            conn.execute(text("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tx_wh_date
+                ON transactions (warehouse_id, date DESC)
+            """))
+            print("正在创建组合索引 ix_tx_relwh_date ...")
+            conn.execute(text("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tx_relwh_date
+                ON transactions (related_warehouse_id, date DESC)
+            """))
+            print("✅ 索引创建成功（或已存在）")
+    except Exception as e:
+        print(f"❌ 错误：{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    add_transactions_date_indexes()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+将 transactions.item_id 外键改为 ON DELETE CASCADE
+
+delete_item 依赖此约束在删除物品时由数据库级联删除关联交易记录，
+替代之前应用侧的两条 DELETE。
+
+使用方法：
+    python add_transactions_fk_cascade.py
+"""
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def add_transactions_fk_cascade():
+    """重建 item_id 外键约束，添加 ON DELETE CASCADE"""
+    engine = create_engine(settings.DATABASE_URL)
+
+    try:
+        with engine.connect() as conn:
+            print("正在重建 transactions.item_id 外键约束 ...")
+            conn.execute(text("""
+                ALTER TABLE transactions
+                DROP CONSTRAINT IF EXISTS transactions_item_id_fkey
+            """))
+            conn.execute(text("""
+                ALTER TABLE transactions
+                ADD CONSTRAINT transactions_item_id_fkey
+                FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
+            """))
+            conn.commit()
+            print("✅ 外键约束已更新为 ON DELETE CASCADE")
+    except Exception as e:
+        print(f"❌ 错误：{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    add_transactions_fk_cascade()
@@ -0,0 +1,26 @@
+"""初始 schema：从 SQLAlchemy 模型建表
+
+对已有数据库（之前由 Base.metadata.create_all 建表）执行时，
+checkfirst 会跳过已存在的表，之后用 alembic stamp head 标记版本即可。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-08-27
+"""
+from alembic import op
+
+from app.database import Base
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    Base.metadata.create_all(bind=op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    Base.metadata.drop_all(bind=op.get_bind(), checkfirst=True)
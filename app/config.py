@@ -1,31 +1,61 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from functools import lru_cache
+from typing import List, Optional
 from pydantic import field_validator
 import sys
 
-class Settings(BaseSettings):
+class CoreSettings(BaseSettings):
+    """最小配置：只解析 DATABASE_URL
+
+    备份/恢复等维护脚本只需要数据库连接串，
+    使用此类可跳过其余字段的解析。
+    """
     DATABASE_URL: str
+
+    class Config:
+        env_file = ".env"
+        case_sensitive = True
+        extra = "ignore"
+
+class Settings(CoreSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173"
     JWT_SECRET: str = "your-secret-key-change-in-production"
+    # 密码快速验证的服务端 pepper（HMAC-SHA256 密钥）。
+    # 配置后登录/Basic Auth 走微秒级 HMAC 比对，bcrypt 仅作为冷路径；
+    # 留空则完全使用 bcrypt
+    PASSWORD_PEPPER: str = ""
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_MINUTES: int = 30
+    # 数据库连接池配置
+    POOL_SIZE: int = 20
+    POOL_MAX_OVERFLOW: int = 40
+    POOL_TIMEOUT: int = 30
+    POOL_RECYCLE: int = 1800
+    POOL_PRE_PING: bool = True
+    # 启动时自动建表（开发环境用；生产环境应使用 alembic upgrade head）
+    AUTO_CREATE_TABLES: bool = False
+    # 速率限制共享存储（多 worker 部署必须配置，否则每个 worker 独立计数）
+    # 示例: redis://localhost:6379/0；不配置则使用进程内存储
+    REDIS_URL: Optional[str] = None
     
+    # CORS_ORIGINS 解析后的列表形式，在 model_post_init 中计算一次
+    cors_origins_list: List[str] = []
+
     @field_validator('CORS_ORIGINS')
     @classmethod
     def parse_cors_origins(cls, v):
         if isinstance(v, str):
             return [origin.strip() for origin in v.split(',') if origin.strip()]
         return v
-    
-    @property
-    def cors_origins_list(self) -> List[str]:
-        """返回 CORS_ORIGINS 作为列表"""
-        if isinstance(self.CORS_ORIGINS, list):
-            return self.CORS_ORIGINS
-        return [origin.strip() for origin in self.CORS_ORIGINS.split(',') if origin.strip()]
-    
+
+    def model_post_init(self, __context) -> None:
+        v = self.CORS_ORIGINS
+        if isinstance(v, str):
+            v = [origin.strip() for origin in v.split(',') if origin.strip()]
+        self.cors_origins_list = list(v)
+
     def validate_jwt_secret(self):
         """验证 JWT_SECRET 是否已更改"""
         default_secret = "your-secret-key-change-in-production"
@@ -62,8 +92,18 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """获取配置单例（可通过 Depends(get_settings) 注入）"""
+    return Settings()
+
+@lru_cache(maxsize=1)
+def get_core_settings() -> CoreSettings:
+    """获取最小配置单例（维护脚本用）"""
+    return CoreSettings()
+
+settings = get_settings()
 
-# 在导入时验证 JWT_SECRET（应用启动时）
-settings.validate_jwt_secret()
+# JWT_SECRET 验证在 app/main.py 启动时执行，
+# 避免管理脚本仅导入配置就触发校验/退出
 
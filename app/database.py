@@ -1,10 +1,53 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 连接池参数：复用连接（避免每请求 TCP+认证握手）、pre_ping 剔除失效连接、
+# recycle 防止长连接被服务端关闭
+_pool_kwargs = dict(
+    pool_size=settings.POOL_SIZE,
+    max_overflow=settings.POOL_MAX_OVERFLOW,
+    pool_timeout=settings.POOL_TIMEOUT,
+    pool_recycle=settings.POOL_RECYCLE,
+    pool_pre_ping=settings.POOL_PRE_PING,
+)
+
+# expire_on_commit=False：commit 后对象属性不过期，返回响应时不再各补一条 SELECT
+# （需要最新行的路径已显式 db.refresh）
+engine = create_engine(settings.DATABASE_URL, **_pool_kwargs)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
+
+# 异步引擎（asyncpg 驱动），用于 async 路由，避免 DB I/O 阻塞事件循环
+async_engine = create_async_engine(
+    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+    **_pool_kwargs,
+)
+
+# 连接池使用计数（可观测性：检出/归还次数）
+pool_stats = {"checkouts": 0, "checkins": 0}
+
+def _register_pool_counters(target_engine):
+    @event.listens_for(target_engine, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+        pool_stats["checkouts"] += 1
+
+    @event.listens_for(target_engine, "checkin")
+    def _on_checkin(dbapi_conn, conn_record):
+        pool_stats["checkins"] += 1
+
+_register_pool_counters(engine)
+_register_pool_counters(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine,
+    class_=AsyncSession,
+)
 
 Base = declarative_base()
 
@@ -15,3 +58,7 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
@@ -1,26 +1,41 @@
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
-from starlette.exceptions import HTTPException as StarletteHTTPException
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from sqlalchemy import text
 from app.routers import categories, warehouses, items, transactions, mfa
-from app.database import engine, Base
+from app.database import engine, async_engine, Base
 from app.config import settings
 import traceback
 
+# 应用启动时验证 JWT_SECRET（默认密钥直接拒绝启动）
+settings.validate_jwt_secret()
+
 # 初始化速率限制器
-limiter = Limiter(key_func=get_remote_address)
+# 配置 REDIS_URL 后计数器存入 Redis，多 worker / 多实例共享限流状态；
+# 未配置时退回进程内存储（仅适合单 worker）
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.REDIS_URL or "memory://",
+    strategy="moving-window"
+)
 
 # Create database tables
-Base.metadata.create_all(bind=engine)
+# 生产环境使用 Alembic 管理 schema（alembic upgrade head），
+# 启动时不做任何 DB 往返；开发环境可设置 AUTO_CREATE_TABLES=true 自动建表
+if settings.AUTO_CREATE_TABLES:
+    Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="LiteWMS API",
     description="LiteWMS 轻量级仓库管理系统后端 API",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson 序列化比标准库 json 快数倍，且原生支持 datetime
+    default_response_class=ORJSONResponse
 )
 
 # 配置速率限制器
@@ -53,6 +68,9 @@ app.add_middleware(
     max_age=3600,
 )
 
+# GZip 压缩：大物品列表响应可从 MB 级压缩到百 KB 级，显著降低传输时间
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Include routers
 app.include_router(categories.router, prefix="/api/categories", tags=["categories"])
 app.include_router(warehouses.router, prefix="/api/warehouses", tags=["warehouses"])
@@ -64,10 +82,41 @@ app.include_router(mfa.router, prefix="/api/mfa", tags=["mfa"])
 def root():
     return {"message": "LiteWMS API", "version": "1.0.0"}
 
+@app.on_event("startup")
+async def expand_threadpool():
+    """扩大 anyio 线程池：bcrypt 等同步调用走线程池，默认 40 个槽位在登录高峰下会成为瓶颈"""
+    from anyio import to_thread
+    to_thread.current_default_thread_limiter().total_tokens = 200
+
+@app.on_event("startup")
+async def warm_connection_pool():
+    """预热连接池：预先建立 POOL_SIZE 个连接，避免首批并发请求各自付出连接开销"""
+    try:
+        conns = [engine.connect() for _ in range(settings.POOL_SIZE)]
+        for conn in conns:
+            conn.execute(text("SELECT 1"))
+        for conn in conns:
+            conn.close()
+        logger.info(f"Connection pool warmed with {settings.POOL_SIZE} connections")
+    except Exception as e:
+        # 预热失败不阻止启动（数据库可能稍后才就绪）
+        logger.warning(f"Connection pool warm-up failed: {e}")
+
 @app.get("/api/health")
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/health/db")
+async def health_check_db():
+    """数据库连通性探针（编排器 readiness 检查用）"""
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return {"status": "healthy"}
+    except Exception as e:
+        logger.error(f"Database health check failed: {e}")
+        return JSONResponse(status_code=503, content={"status": "unhealthy"})
+
 @app.get("/api/test-cors")
 def test_cors():
     """Test endpoint to verify CORS is working"""
@@ -76,45 +125,25 @@ def test_cors():
         "cors_origins": cors_origins
     }
 
-# Global exception handler to ensure CORS headers are always present
+# 异常处理：HTTPException / 校验错误的 handler 在中间件栈内部执行，
+# 响应会由 CORSMiddleware 补上 CORS 头；但 Exception 级 handler 挂在
+# 最外层的 ServerErrorMiddleware 上，在 CORSMiddleware 之外运行，
+# 500 响应必须在这里手工补头，否则浏览器端表现为不透明的 CORS 失败
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    """Handle all exceptions and ensure CORS headers are present"""
-    import logging
-    logger = logging.getLogger(__name__)
+    """Log unhandled exceptions and return a JSON 500"""
     logger.error(f"Unhandled exception: {type(exc).__name__}: {str(exc)}", exc_info=True)
-    
-    # Get origin from request
-    origin = request.headers.get("origin", "*")
-    if origin not in cors_origins and "*" not in cors_origins:
-        origin = cors_origins[0] if cors_origins else "*"
-    
-    return JSONResponse(
-        status_code=500,
-        content={"detail": f"Internal server error: {str(exc)}"},
-        headers={
+    headers = {}
+    origin = request.headers.get("origin")
+    if origin and ("*" in cors_origins or origin in cors_origins):
+        headers = {
             "Access-Control-Allow-Origin": origin,
             "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
-            "Access-Control-Allow-Headers": "*",
+            "Vary": "Origin",
         }
-    )
-
-@app.exception_handler(StarletteHTTPException)
-async def http_exception_handler(request: Request, exc: StarletteHTTPException):
-    """Handle HTTP exceptions and ensure CORS headers are present"""
-    origin = request.headers.get("origin", "*")
-    if origin not in cors_origins and "*" not in cors_origins:
-        origin = cors_origins[0] if cors_origins else "*"
-    
     return JSONResponse(
-        status_code=exc.status_code,
-        content={"detail": exc.detail},
-        headers={
-            "Access-Control-Allow-Origin": origin,
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
-            "Access-Control-Allow-Headers": "*",
-        }
+        status_code=500,
+        content={"detail": f"Internal server error: {str(exc)}"},
+        headers=headers,
     )
 
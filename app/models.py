@@ -1,7 +1,38 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Numeric, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, JSON, Numeric, Boolean, TypeDecorator, desc, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
+import json
+
+class JSONBSnapshot(TypeDecorator):
+    """Python 侧保持 JSON 字符串（现有 API 契约），数据库侧存 JSONB
+
+    JSONB 让 Postgres 能直接按 reverted / 品类等键做服务端过滤并建 GIN 索引，
+    免去逐行取回再在 Python 里解析。旧的纯文本快照以 JSON 字符串值存储。
+    """
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(JSON())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not isinstance(value, str):
+            return value
+        try:
+            return json.loads(value)
+        except (ValueError, TypeError):
+            # 旧纯文本格式：作为 JSON 字符串值存储
+            return value
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return json.dumps(value, ensure_ascii=False)
 
 class Category(Base):
     __tablename__ = "categories"
@@ -27,7 +58,21 @@ class Warehouse(Base):
 
 class InventoryItem(Base):
     __tablename__ = "items"
-    
+    # 组合索引：get_items / create_item 同时按仓库和品类过滤
+    # 唯一表达式索引：create_item 的 ON CONFLICT 仲裁目标，
+    # 建在模型上保证 create_all / alembic 新建库时一并创建
+    # （已有库由 add_items_unique_index.py 补建）
+    __table_args__ = (
+        Index("ix_items_wh_cat", "warehouse_id", "category_id"),
+        Index(
+            "uq_items_wh_cat_specs",
+            "warehouse_id",
+            "category_id",
+            text("md5(specs::text)"),
+            unique=True,
+        ),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False, index=True)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False, index=True)
@@ -41,12 +86,25 @@ class InventoryItem(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
-    
+    # 组合索引：get_transactions 按仓库（本仓/调拨对端）过滤并按 date DESC 分页
+    __table_args__ = (
+        Index("ix_tx_wh_date", "warehouse_id", desc("date")),
+        Index("ix_tx_relwh_date", "related_warehouse_id", desc("date")),
+        # GIN 索引：支持按快照键（如 reverted）做服务端过滤
+        Index(
+            "ix_tx_snapshot_gin",
+            "item_name_snapshot",
+            postgresql_using="gin",
+            postgresql_ops={"item_name_snapshot": "jsonb_path_ops"},
+        ),
+    )
+
+
     id = Column(Integer, primary_key=True, index=True)
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False, index=True)
     related_warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=True)
-    item_id = Column(Integer, ForeignKey("items.id"), nullable=False, index=True)
-    item_name_snapshot = Column(String, nullable=False)
+    item_id = Column(Integer, ForeignKey("items.id", ondelete="CASCADE"), nullable=False, index=True)
+    item_name_snapshot = Column(JSONBSnapshot, nullable=False)
     quantity = Column(Integer, nullable=False)  # Negative for outbound, Positive for inbound
     date = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     user = Column(String, nullable=False)
@@ -54,6 +112,7 @@ class Transaction(Base):
     type = Column(String, nullable=False)  # 'IN', 'OUT', 'ADJUST', 'TRANSFER'
     
     warehouse = relationship("Warehouse", foreign_keys=[warehouse_id], back_populates="transactions")
+    related_warehouse = relationship("Warehouse", foreign_keys=[related_warehouse_id])
     item = relationship("InventoryItem", back_populates="transactions")
 
 class Admin(Base):
@@ -61,7 +120,9 @@ class Admin(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     password_hash = Column(String, nullable=True)  # NULL means password not set yet
-    totp_secret = Column(JSON, nullable=True)  # Changed to JSON to store array of secrets: [{"secret": "...", "name": "设备1", "created_at": "..."}, ...]
+    password_fast_hash = Column(String, nullable=True)  # HMAC-SHA256(pepper, password)，快速验证路径
+    # MutableList 让原地 append/删除也能触发 UPDATE，无需整列重新赋值或 expire/refresh
+    totp_secret = Column(MutableList.as_mutable(JSON), nullable=True)  # [{"secret": "...", "name": "设备1", "created_at": "..."}, ...]
     mfa_enabled = Column(Boolean, default=True, nullable=False)  # MFA 开关，默认启用
     mfa_settings = Column(JSON, nullable=True)  # 细粒度 MFA 配置: {"inbound": true, "outbound": false, ...}
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,143 +1,232 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import delete, func, lambda_stmt, select, text, update
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import List, Optional
-from app.database import get_db
+from collections import OrderedDict
+from time import monotonic
+from app.database import get_async_db
 from app import models, schemas
 from app.routers.mfa import get_operation_token
 
 router = APIRouter()
 
-@router.get("/", response_model=List[schemas.InventoryItem])
-def get_items(
+# 物品列表响应缓存（按查询参数缓存，写操作时整体失效）
+# 生产环境多 worker 部署应使用 Redis 等共享缓存
+ITEMS_CACHE_TTL = 60  # 秒
+# 条目上限：键含调用方任选的 skip/limit，无上限会被未认证请求无限撑大进程内存
+_ITEMS_CACHE_MAX = 256
+# 列表查询每批取回的行数（服务端游标）
+STREAM_BATCH_SIZE = 200
+_items_cache = OrderedDict()  # {key: (expires_at, payload)}，LRU 序
+
+def _cache_get(key):
+    entry = _items_cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] <= monotonic():
+        # 过期条目就地清除，不留僵尸占位
+        del _items_cache[key]
+        return None
+    _items_cache.move_to_end(key)
+    return entry[1]
+
+def _cache_set(key, payload):
+    _items_cache[key] = (monotonic() + ITEMS_CACHE_TTL, payload)
+    _items_cache.move_to_end(key)
+    while len(_items_cache) > _ITEMS_CACHE_MAX:
+        _items_cache.popitem(last=False)
+
+def _cache_invalidate():
+    _items_cache.clear()
+
+@router.get("/", response_model=List[schemas.InventoryItem], response_class=ORJSONResponse)
+async def get_items(
+    response: Response,
     warehouse_id: Optional[int] = None,
     category_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 1000,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.InventoryItem)
-    
+    response.headers["Cache-Control"] = f"max-age={ITEMS_CACHE_TTL}"
+
+    cache_key = ("items", warehouse_id, category_id, skip, limit)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    stmt = select(models.InventoryItem)
+
     if warehouse_id:
-        query = query.filter(models.InventoryItem.warehouse_id == warehouse_id)
+        stmt = stmt.where(models.InventoryItem.warehouse_id == warehouse_id)
     if category_id:
-        query = query.filter(models.InventoryItem.category_id == category_id)
-    
-    items = query.offset(skip).limit(limit).all()
+        stmt = stmt.where(models.InventoryItem.category_id == category_id)
+
+    # 服务端游标分批取行（yield_per），内存峰值与批大小而非 limit 成正比
+    result = await db.stream(
+        stmt.offset(skip).limit(limit).execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    items = []
+    async for item in result.scalars():
+        items.append({
+            "id": item.id,
+            "warehouse_id": item.warehouse_id,
+            "category_id": item.category_id,
+            "specs": item.specs,
+            "quantity": item.quantity,
+            "updated_at": item.updated_at
+        })
+    _cache_set(cache_key, items)
     return items
 
-@router.get("/with-category", response_model=List[schemas.InventoryItemWithCategory])
-def get_items_with_category(
+@router.get("/with-category", response_model=List[schemas.InventoryItemWithCategory], response_class=ORJSONResponse)
+async def get_items_with_category(
+    response: Response,
     warehouse_id: Optional[int] = None,
     category_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 1000,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(
-        models.InventoryItem,
-        models.Category.name.label('category_name')
-    ).join(models.Category, models.InventoryItem.category_id == models.Category.id)
-    
+    response.headers["Cache-Control"] = f"max-age={ITEMS_CACHE_TTL}"
+
+    cache_key = ("items_with_category", warehouse_id, category_id, skip, limit)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # joinedload + load_only：单条 JOIN 查询取品类名，
+    # 且不取 Category.attributes 这个大 JSON 列
+    stmt = select(models.InventoryItem).options(
+        joinedload(models.InventoryItem.category).load_only(models.Category.name)
+    )
+
     if warehouse_id:
-        query = query.filter(models.InventoryItem.warehouse_id == warehouse_id)
+        stmt = stmt.where(models.InventoryItem.warehouse_id == warehouse_id)
     if category_id:
-        query = query.filter(models.InventoryItem.category_id == category_id)
-    
-    results = query.offset(skip).limit(limit).all()
-    
+        stmt = stmt.where(models.InventoryItem.category_id == category_id)
+
+    result = await db.stream(
+        stmt.offset(skip).limit(limit).execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
     items = []
-    for item, category_name in results:
-        item_dict = {
+    async for item in result.scalars():
+        items.append({
             "id": item.id,
             "warehouse_id": item.warehouse_id,
             "category_id": item.category_id,
             "specs": item.specs,
             "quantity": item.quantity,
             "updated_at": item.updated_at,
-            "category_name": category_name
-        }
-        items.append(item_dict)
-    
+            "category_name": item.category.name
+        })
+
+    _cache_set(cache_key, items)
     return items
 
+def _get_item_stmt(item_id: int):
+    """按主键取物品的缓存语句（lambda_stmt 复用已构建/已编译的 SQL）"""
+    stmt = lambda_stmt(lambda: select(models.InventoryItem))
+    stmt += lambda s: s.where(models.InventoryItem.id == item_id)
+    return stmt
+
 @router.get("/{item_id}", response_model=schemas.InventoryItem)
-def get_item(item_id: int, db: Session = Depends(get_db)):
-    item = db.query(models.InventoryItem).filter(models.InventoryItem.id == item_id).first()
+async def get_item(item_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(_get_item_stmt(item_id))
+    item = result.scalars().first()
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    return item
+
+    # 弱 ETag（id + 更新时间），命中 If-None-Match 时返回 304，省去响应体序列化
+    etag = f'W/"{item.id}-{int(item.updated_at.timestamp())}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+
+    return ORJSONResponse(
+        {
+            "id": item.id,
+            "warehouse_id": item.warehouse_id,
+            "category_id": item.category_id,
+            "specs": item.specs,
+            "quantity": item.quantity,
+            "updated_at": item.updated_at
+        },
+        headers={"ETag": etag, "Cache-Control": "private, max-age=30"}
+    )
 
 @router.post("/", response_model=schemas.InventoryItem)
-def create_item(
+async def create_item(
     item: schemas.InventoryItemCreate,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
-    # Check if item with same specs exists in the warehouse
-    existing_items = db.query(models.InventoryItem).filter(
-        and_(
-            models.InventoryItem.warehouse_id == item.warehouse_id,
-            models.InventoryItem.category_id == item.category_id
-        )
-    ).all()
-    
-    for existing in existing_items:
-        if existing.specs == item.specs:
-            # Update quantity
-            existing.quantity += item.quantity
-            from datetime import datetime
-            existing.updated_at = datetime.utcnow()
-            db.commit()
-            db.refresh(existing)
-            return existing
-    
-    # Create new item
-    db_item = models.InventoryItem(**item.dict())
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    # 单条 UPSERT：同仓库/品类/规格的物品存在则累加数量，否则插入新行
+    # （依赖 uq_items_wh_cat_specs 唯一索引，见 add_items_unique_index.py）
+    stmt = pg_insert(models.InventoryItem).values(**item.dict())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            models.InventoryItem.warehouse_id,
+            models.InventoryItem.category_id,
+            text("md5(specs::text)")
+        ],
+        set_={
+            "quantity": models.InventoryItem.quantity + stmt.excluded.quantity,
+            "updated_at": func.now()
+        }
+    ).returning(models.InventoryItem)
+
+    result = await db.execute(stmt)
+    db_item = result.scalar_one()
+    await db.commit()
+    _cache_invalidate()
     return db_item
 
 @router.put("/{item_id}", response_model=schemas.InventoryItem)
-def update_item(
+async def update_item(
     item_id: int,
     item_update: schemas.InventoryItemUpdate,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
-    db_item = db.query(models.InventoryItem).filter(models.InventoryItem.id == item_id).first()
-    if not db_item:
+    # 单条 UPDATE ... RETURNING，省去先 SELECT 再逐属性赋值的往返
+    stmt = (
+        update(models.InventoryItem)
+        .where(models.InventoryItem.id == item_id)
+        .values(**item_update.dict(exclude_unset=True), updated_at=datetime.utcnow())
+        .returning(models.InventoryItem)
+    )
+    result = await db.execute(stmt)
+    db_item = result.scalar_one_or_none()
+    if db_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    
-    for key, value in item_update.dict(exclude_unset=True).items():
-        setattr(db_item, key, value)
-    
-    from datetime import datetime
-    db_item.updated_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(db_item)
+
+    await db.commit()
+    _cache_invalidate()
     return db_item
 
 @router.delete("/{item_id}")
-def delete_item(
+async def delete_item(
     item_id: int,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
-    db_item = db.query(models.InventoryItem).filter(models.InventoryItem.id == item_id).first()
-    if not db_item:
+    # 单条 DELETE，关联交易记录由外键 ON DELETE CASCADE 一并删除
+    # （见 add_transactions_fk_cascade.py）
+    result = await db.execute(
+        delete(models.InventoryItem)
+        .where(models.InventoryItem.id == item_id)
+        .returning(models.InventoryItem.id)
+    )
+    if result.first() is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    
-    # Delete related transactions first
-    db.query(models.Transaction).filter(models.Transaction.item_id == item_id).delete()
-    
-    # Then delete the item
-    db.delete(db_item)
-    db.commit()
-    return {"message": "Item deleted successfully"}
 
+    await db.commit()
+    _cache_invalidate()
+    return {"message": "Item deleted successfully"}
@@ -1,26 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import JSON, cast, func, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session, load_only
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
+# PyJWT：HS256 签名/验签走 OpenSSL 的 HMAC-SHA256，比 python-jose 的纯 Python 实现快数倍
+import jwt as pyjwt
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from collections import defaultdict
+from collections import OrderedDict
+from types import MappingProxyType
 from typing import Optional
+import hashlib
+import hmac
 import pyotp
-import qrcode
+import segno
 import io
 import base64
+import binascii
 import secrets
 import json
 import logging
+import threading
+import time
 
 from app.database import get_db
 from app.models import Admin
 from app.config import settings
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -32,29 +43,205 @@ security = HTTPBasic()
 # 速率限制器将在 main.py 中初始化并设置到 app.state.limiter
 # 在 router 中使用时，需要通过 request.app.state.limiter 访问
 
-# 登录失败记录（用于账户级别的速率限制）
-# 生产环境应使用 Redis 等持久化存储
-login_failed_attempts = defaultdict(list)  # {identifier: [timestamp1, timestamp2, ...]}
+# 登录失败限制：5 次 / 5 分钟
+LOGIN_FAIL_MAX = 5
+LOGIN_FAIL_WINDOW = 300  # 秒
+
+# 配置 REDIS_URL 时，失败记录存入 Redis Sorted Set（score=时间戳），
+# 由 Lua 脚本在单次往返内完成清理+计数/写入，多 worker 共享且自动过期
+_LOGIN_CHECK_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+return redis.call('ZCARD', KEYS[1])
+"""
+
+_LOGIN_RECORD_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+redis.call('ZADD', KEYS[1], tonumber(ARGV[1]), ARGV[3])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+return redis.call('ZCARD', KEYS[1])
+"""
+
+_redis_client = None
+_login_check_script = None
+_login_record_script = None
+if settings.REDIS_URL:
+    import redis
+    _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    _login_check_script = _redis_client.register_script(_LOGIN_CHECK_SCRIPT)
+    _login_record_script = _redis_client.register_script(_LOGIN_RECORD_SCRIPT)
+
+# 未配置 Redis 时的进程内回退（仅适合单 worker）
+# 只需回答"5 分钟内是否失败 ≥5 次"，存 (次数, 窗口起点) 即可，O(1) 更新
+login_failed_attempts = {}  # {identifier: (count, window_start)}
+_LOGIN_ATTEMPTS_SWEEP_AT = 1024  # 超过该条目数时顺带清理过期窗口，限制内存增长
+
+def _sweep_login_attempts(now: float):
+    if len(login_failed_attempts) < _LOGIN_ATTEMPTS_SWEEP_AT:
+        return
+    expired = [
+        ident for ident, (_, window_start) in login_failed_attempts.items()
+        if now - window_start > LOGIN_FAIL_WINDOW
+    ]
+    for ident in expired:
+        login_failed_attempts.pop(ident, None)
+
+# bcrypt 验证结果缓存：Basic Auth 每个请求都会重新验证同一密码，
+# 每次 bcrypt 运算约 40-250ms（CPU 密集）。缓存成功结果可让热路径变成哈希查表。
+# 只缓存成功结果（避免错误密码被缓存）；改密后 hash 变化，旧缓存键自然失效。
+_VERIFY_CACHE_MAX = 1024
+_VERIFY_CACHE_TTL = 300  # 秒
+_verify_cache = OrderedDict()  # {(sha256(plain), hashed): expires_at}
+_verify_cache_lock = threading.Lock()
+
+def _prehash_password(password: str) -> bytes:
+    """bcrypt 前置 HMAC-SHA256 预哈希（Django/Dropbox 同款做法）
+
+    32 字节摘要远在 bcrypt 72 字节上限之内：长口令不再被截断丢熵，
+    也不会在多字节字符中间切断 UTF-8 序列。
+
+    HMAC 密钥必须是与配置无关的固定常量：若把 pepper 掺进预哈希，
+    启用或轮换 pepper 会让所有已存 bcrypt 哈希全部失效。
+    """
+    key = b"litewms-bcrypt-prehash"
+    return base64.b64encode(hmac.new(key, password.encode('utf-8'), 'sha256').digest())
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    key = (hashlib.sha256(plain_password.encode('utf-8')).digest(), hashed_password)
+    now = time.monotonic()
+
+    with _verify_cache_lock:
+        expires_at = _verify_cache.get(key)
+        if expires_at is not None:
+            if expires_at > now:
+                _verify_cache.move_to_end(key)
+                return True
+            del _verify_cache[key]
+
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        verified = pwd_context.verify(_prehash_password(plain_password), hashed_password)
+        if not verified:
+            # 兼容旧格式哈希：直接对明文（UTF-8 截断到 72 字节）做 bcrypt
+            legacy = plain_password.encode('utf-8')[:72]
+            verified = pwd_context.verify(legacy, hashed_password)
     except Exception as e:
         logger.error(f"Password verification error: {e}")
         return False
 
+    if verified:
+        with _verify_cache_lock:
+            _verify_cache[key] = now + _VERIFY_CACHE_TTL
+            _verify_cache.move_to_end(key)
+            while len(_verify_cache) > _VERIFY_CACHE_MAX:
+                _verify_cache.popitem(last=False)
+
+    return verified
+
+def compute_fast_hash(password: str) -> Optional[str]:
+    """HMAC-SHA256(pepper, password)，未配置 PASSWORD_PEPPER 时返回 None"""
+    if not settings.PASSWORD_PEPPER:
+        return None
+    return hmac.new(
+        settings.PASSWORD_PEPPER.encode('utf-8'),
+        password.encode('utf-8'),
+        'sha256'
+    ).hexdigest()
+
+def verify_admin_credentials(plain_password: str, admin: "Admin", db: Session) -> bool:
+    """验证管理员密码：HMAC 快路径优先，bcrypt 作为冷路径（旧数据懒升级）
+
+    单管理员账户 + 服务端 pepper 的前提下，HMAC-SHA256 比对足够安全，
+    把每次登录 ~100ms 的 bcrypt 运算压缩到微秒级。
+    """
+    fast_hash = compute_fast_hash(plain_password)
+    if fast_hash and admin.password_fast_hash:
+        if hmac.compare_digest(admin.password_fast_hash, fast_hash):
+            return True
+        # 快速哈希不匹配不能直接判失败：外部脚本重置密码后该列可能是
+        # 过期值，此时以 bcrypt 为准，验证通过后在下方纠正快速哈希
+
+    if not verify_password(plain_password, admin.password_hash):
+        return False
+
+    # bcrypt 验证通过且配置了 pepper：补写/纠正快速哈希，后续请求走快路径
+    if fast_hash and admin.password_fast_hash != fast_hash:
+        admin.password_fast_hash = fast_hash
+        db.commit()
+
+    return True
+
+# TOTP 密钥缓存：pyotp.TOTP() 每次构造都要 base32 解码 + 建 HMAC 上下文，
+# N 个设备 × 每次验证都重复。缓存解码后的原始密钥，验证时直接算 HOTP。
+_totp_keys = {}  # {secret: raw_key_bytes}
+
+def _get_totp_key(secret: str) -> bytes:
+    key = _totp_keys.get(secret)
+    if key is None:
+        padded = secret.upper() + '=' * ((8 - len(secret)) % 8)
+        key = base64.b32decode(padded)
+        _totp_keys[secret] = key
+    return key
+
+def _hotp(key: bytes, counter: int) -> str:
+    """HOTP（RFC 4226）：HMAC-SHA1 + 动态截断，6 位"""
+    mac = hmac.new(key, counter.to_bytes(8, 'big'), hashlib.sha1).digest()
+    offset = mac[19] & 0xf
+    return str(
+        (int.from_bytes(mac[offset:offset + 4], 'big') & 0x7fffffff) % 1000000
+    ).zfill(6)
+
+def verify_totp_code(secret: str, code: str, valid_window: int = 1) -> bool:
+    """验证 TOTP 码（RFC 6238，30 秒步长，6 位）
+
+    等价于 pyotp.TOTP(secret).verify(code, valid_window=valid_window)，
+    但复用缓存的解码密钥，每个时间窗口只需一次 HMAC-SHA1。
+    """
+    key = _get_totp_key(secret)
+    t = int(time.time()) // 30
+    for counter in range(t - valid_window, t + valid_window + 1):
+        if hmac.compare_digest(_hotp(key, counter), code):
+            return True
+    return False
+
+def match_totp_device(secrets_list: list, code: str, valid_window: int = 1):
+    """在所有设备中查找与提交验证码匹配的设备，无匹配返回 None
+
+    按时间计数器外层遍历：当前窗口（t）优先，命中即返回，
+    常见情况下每个设备只需一次 HMAC-SHA1，而不是每设备 3 次。
+    """
+    keys = []
+    for device in secrets_list:
+        secret = device.get("secret")
+        if not secret:
+            continue
+        try:
+            keys.append((_get_totp_key(secret), device))
+        except Exception as e:
+            logger.warning("Error decoding secret for device %s: %s", device.get('name', '?'), e)
+            continue
+
+    t = int(time.time()) // 30
+    # 先试当前计数器，再试相邻窗口
+    counters = [t] + [t + d for w in range(1, valid_window + 1) for d in (-w, w)]
+    for counter in counters:
+        for key, device in keys:
+            if hmac.compare_digest(_hotp(key, counter), code):
+                return device
+    return None
+
 def get_password_hash(password: str) -> str:
-    # Ensure password is encoded as bytes and handle length limit
-    if isinstance(password, str):
-        password = password.encode('utf-8')
-    # Bcrypt has a 72 byte limit, truncate if necessary
-    if len(password) > 72:
-        password = password[:72]
-    return pwd_context.hash(password)
-
-def get_admin(db: Session) -> Admin:
-    """Get or create admin record"""
-    admin = db.query(Admin).first()
+    # 预哈希后再 bcrypt：避免 72 字节截断（丢熵/切断多字节字符）
+    return pwd_context.hash(_prehash_password(password))
+
+def _fetch_admin(db: Session) -> Admin:
+    """查询（或首次创建）单例 admin 行"""
+    admin = db.query(Admin).options(load_only(
+        Admin.id,
+        Admin.password_hash,
+        Admin.password_fast_hash,
+        Admin.totp_secret,
+        Admin.mfa_enabled,
+        Admin.mfa_settings,
+    )).first()
     if not admin:
         admin = Admin()
         db.add(admin)
@@ -62,21 +249,33 @@ def get_admin(db: Session) -> Admin:
         db.refresh(admin)
     return admin
 
-def verify_admin_password(
+def get_admin(request: Request, db: Session = Depends(get_db)) -> Admin:
+    """获取 admin 行（按请求缓存）
+
+    get_operation_token、get_current_admin 和端点本身都可能需要 admin 行，
+    缓存在 request.state 上保证每个请求只 SELECT 一次。
+    """
+    admin = getattr(request.state, "admin", None)
+    if admin is None:
+        admin = _fetch_admin(db)
+        request.state.admin = admin
+    return admin
+
+async def verify_admin_password(
     credentials: HTTPBasicCredentials = Depends(security),
+    admin: Admin = Depends(get_admin),
     db: Session = Depends(get_db)
 ):
     """Verify admin password for protected endpoints"""
-    admin = get_admin(db)
-    
     if not admin.password_hash:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Admin password not set",
             headers={"WWW-Authenticate": "Basic"},
         )
-    
-    if not verify_password(credentials.password, admin.password_hash):
+
+    # bcrypt 冷路径约 250ms，放到线程池避免阻塞事件循环
+    if not await run_in_threadpool(verify_admin_credentials, credentials.password, admin, db):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password",
@@ -85,6 +284,27 @@ def verify_admin_password(
     
     return admin
 
+# 细粒度 MFA 默认配置：不可变，模块级共享，避免每次请求重建字面量字典
+_DEFAULT_MFA_SETTINGS = MappingProxyType({
+    "inbound": True,
+    "outbound": False,
+    "transfer": True,
+    "adjust": True,
+    "category_create": True,
+    "category_update": True,
+    "category_delete": True,
+    "warehouse_create": True,
+    "warehouse_update": True,
+    "warehouse_delete": True
+})
+
+def _merged_mfa_settings(admin: Admin) -> dict:
+    """默认配置与 admin 现有配置合并（一次 C 层 dict.update）"""
+    merged = dict(_DEFAULT_MFA_SETTINGS)
+    if admin.mfa_settings and isinstance(admin.mfa_settings, dict):
+        merged.update(admin.mfa_settings)
+    return merged
+
 # Schemas
 class SetPasswordRequest(BaseModel):
     password: str
@@ -114,8 +334,23 @@ class AdminStatusResponse(BaseModel):
     mfa_enabled: bool = True
     mfa_settings: dict = {}  # 细粒度 MFA 配置
 
+class MFASettings(BaseModel):
+    """细粒度 MFA 配置：键名与 bool 类型由 pydantic（Rust 层）校验，未知键直接忽略"""
+    model_config = ConfigDict(extra="ignore")
+
+    inbound: bool = True
+    outbound: bool = False
+    transfer: bool = True
+    adjust: bool = True
+    category_create: bool = True
+    category_update: bool = True
+    category_delete: bool = True
+    warehouse_create: bool = True
+    warehouse_update: bool = True
+    warehouse_delete: bool = True
+
 class MFASettingsRequest(BaseModel):
-    settings: dict  # 细粒度 MFA 配置字典
+    settings: MFASettings
 
 class MFADeviceInfo(BaseModel):
     id: str
@@ -137,59 +372,55 @@ class LoginResponse(BaseModel):
 class ToggleMFARequest(BaseModel):
     enabled: bool
 
-class MFASettingsRequest(BaseModel):
-    settings: dict  # 细粒度 MFA 配置字典
-
 # Endpoints
+# totp_secret 列在写入时保证为规范化的设备列表（list[dict]），
+# 历史多格式数据由 normalize_totp_secrets.py 一次性迁移，
+# 读取方不再需要 isinstance/嵌套 json.loads 解码
+# /status 结果缓存：前端按页面加载/定时器轮询该接口，而内容只在管理员
+# 显式修改密码或 MFA 时变化。1 秒 TTL 即可把高频轮询的 SELECT 摊薄到每秒一次。
+_STATUS_TTL = 1.0  # 秒
+_status_cache = None  # (cached_at, payload) 或 None
+
+def _invalidate_status_cache():
+    global _status_cache
+    _status_cache = None
+
 @router.get("/status", response_model=AdminStatusResponse)
-def get_admin_status(db: Session = Depends(get_db)):
+def get_admin_status(request: Request, db: Session = Depends(get_db)):
     """Check if admin password and MFA are set"""
-    admin = get_admin(db)
-    
-    mfa_count = 0
-    if admin.totp_secret:
-        if isinstance(admin.totp_secret, list):
-            mfa_count = len(admin.totp_secret)
-        elif isinstance(admin.totp_secret, str):
-            mfa_count = 1  # Legacy format
-    
+    global _status_cache
+    now = time.monotonic()
+    if _status_cache is not None and now - _status_cache[0] < _STATUS_TTL:
+        return _status_cache[1]
+
+    admin = get_admin(request, db)
+
+    mfa_count = len(admin.totp_secret) if admin.totp_secret else 0
+
     # 如果 mfa_enabled 字段不存在（旧数据），默认为 True
     mfa_enabled = admin.mfa_enabled if hasattr(admin, 'mfa_enabled') and admin.mfa_enabled is not None else True
-    
+
     # 获取细粒度 MFA 配置，如果不存在则使用默认值
-    default_settings = {
-        "inbound": True,
-        "outbound": False,
-        "transfer": True,
-        "adjust": True,
-        "category_create": True,
-        "category_update": True,
-        "category_delete": True,
-        "warehouse_create": True,
-        "warehouse_update": True,
-        "warehouse_delete": True
-    }
-    
-    if admin.mfa_settings and isinstance(admin.mfa_settings, dict):
-        # 合并默认值和现有配置，确保所有字段都存在
-        mfa_settings = {**default_settings, **admin.mfa_settings}
-    else:
-        mfa_settings = default_settings
-    
-    return {
+    mfa_settings = _merged_mfa_settings(admin)
+
+    payload = {
         "password_set": admin.password_hash is not None,
         "mfa_set": mfa_count > 0,
         "mfa_count": mfa_count,
         "mfa_enabled": mfa_enabled,
         "mfa_settings": mfa_settings
     }
+    _status_cache = (now, payload)
+    return payload
 
 @router.post("/set-password")
-def set_password(request: SetPasswordRequest, db: Session = Depends(get_db)):
+def set_password(
+    request: SetPasswordRequest,
+    admin: Admin = Depends(get_admin),
+    db: Session = Depends(get_db)
+):
     """Set admin password (first time setup)"""
     try:
-        admin = get_admin(db)
-        
         if admin.password_hash:
             raise HTTPException(status_code=400, detail="Password already set. Use change-password endpoint.")
         
@@ -201,7 +432,9 @@ def set_password(request: SetPasswordRequest, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail="Password cannot be longer than 72 characters")
         
         admin.password_hash = get_password_hash(request.password)
+        admin.password_fast_hash = compute_fast_hash(request.password)
         db.commit()
+        _invalidate_status_cache()
         return {"message": "Password set successfully"}
     except HTTPException:
         raise
@@ -209,6 +442,41 @@ def set_password(request: SetPasswordRequest, db: Session = Depends(get_db)):
                     logger.error(f"Error setting password: {e}")
                     raise HTTPException(status_code=500, detail=f"Failed to set password: {str(e)}")
 
+# JWT 验签结果缓存：同一 token 在有效期内会被每个受保护请求重复验签，
+# 缓存 (token 哈希) -> (payload, exp)，有效期以 token 自身的 exp 为准
+_JWT_CACHE_MAX = 4096
+_jwt_cache = OrderedDict()  # {blake2b(token): (payload, exp)}
+_jwt_cache_lock = threading.Lock()
+
+def _decode_jwt(token: str) -> dict:
+    """解码并验签 JWT，带进程内缓存；失败时抛 pyjwt.InvalidTokenError"""
+    key = hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+    now = time.time()
+
+    with _jwt_cache_lock:
+        cached = _jwt_cache.get(key)
+        if cached is not None:
+            payload, exp = cached
+            if now < exp:
+                _jwt_cache.move_to_end(key)
+                return payload
+            del _jwt_cache[key]
+
+    payload = pyjwt.decode(
+        token,
+        settings.JWT_SECRET,
+        algorithms=[settings.JWT_ALGORITHM],
+        options={"require": ["exp", "type"]},
+    )
+
+    with _jwt_cache_lock:
+        _jwt_cache[key] = (payload, payload["exp"])
+        _jwt_cache.move_to_end(key)
+        while len(_jwt_cache) > _JWT_CACHE_MAX:
+            _jwt_cache.popitem(last=False)
+
+    return payload
+
 def verify_jwt_token(token: str):
     """Verify JWT token"""
     if not token:
@@ -219,11 +487,11 @@ def verify_jwt_token(token: str):
         )
     
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+        payload = _decode_jwt(token)
         if payload.get("type") != "mfa_admin":
             raise HTTPException(status_code=401, detail="Invalid token type")
         return payload
-    except JWTError:
+    except pyjwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -239,7 +507,7 @@ def verify_operation_token(token: str):
             headers={"WWW-Authenticate": "Bearer"}
         )
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+        payload = _decode_jwt(token)
         if payload.get("type") != "operation":
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -251,7 +519,7 @@ def verify_operation_token(token: str):
                 detail="操作 token 未验证"
             )
         return payload
-    except JWTError:
+    except pyjwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="操作 token 已过期或无效，请重新进行 MFA 验证",
@@ -260,24 +528,14 @@ def verify_operation_token(token: str):
 
 def get_operation_token(
     authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    admin: Admin = Depends(get_admin)
 ):
     """
     Get and verify operation token from Authorization header.
     Only requires token if MFA is set up and enabled.
     """
-    admin = get_admin(db)
-    
-    # 检查 MFA 是否已设置
-    mfa_count = 0
-    if admin.totp_secret:
-        if isinstance(admin.totp_secret, list):
-            mfa_count = len(admin.totp_secret)
-        elif isinstance(admin.totp_secret, str):
-            mfa_count = 1  # Legacy format
-    
     # 如果 MFA 未设置，不需要操作 token
-    if mfa_count == 0:
+    if not admin.totp_secret:
         return None
     
     # 检查 MFA 全局开关是否启用
@@ -295,99 +553,62 @@ def get_operation_token(
     token = authorization.replace("Bearer ", "")
     return verify_operation_token(token)
 
-def get_current_admin(
+async def get_current_admin(
     authorization: str = Header(None),
+    admin: Admin = Depends(get_admin),
     db: Session = Depends(get_db)
 ):
     """Get current admin from JWT token or Basic Auth (backward compatibility)"""
-    # Try JWT token first (from Authorization header)
-    if authorization and authorization.startswith("Bearer "):
-        token = authorization.replace("Bearer ", "")
-        verify_jwt_token(token)
-        return get_admin(db)
-    
-    # Fallback to Basic Auth for backward compatibility
-    try:
-        credentials = security(None)
-        return verify_admin_password(credentials, db)
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    if authorization:
+        # Try JWT token first (from Authorization header)
+        if authorization.startswith("Bearer "):
+            verify_jwt_token(authorization[7:])
+            return admin
+
+        # Fallback to Basic Auth for backward compatibility
+        if authorization.startswith("Basic "):
+            try:
+                raw = base64.b64decode(authorization[6:]).decode('utf-8')
+            except (binascii.Error, ValueError, UnicodeDecodeError):
+                raw = None
+            if raw is not None:
+                username, _, password = raw.partition(':')
+                credentials = HTTPBasicCredentials(username=username, password=password)
+                return await verify_admin_password(credentials, admin, db)
+
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
 @router.post("/change-password")
-def change_password(
+async def change_password(
     request: ChangePasswordRequest,
-    authorization: str = Header(None),
+    admin: Admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Change admin password - supports both JWT token and Basic Auth"""
-    admin = get_current_admin(authorization, db)
-    
-    if not verify_password(request.old_password, admin.password_hash):
+    if not await run_in_threadpool(verify_admin_credentials, request.old_password, admin, db):
         raise HTTPException(status_code=401, detail="当前密码错误")
-    
-    admin.password_hash = get_password_hash(request.new_password)
+
+    admin.password_hash = await run_in_threadpool(get_password_hash, request.new_password)
+    admin.password_fast_hash = compute_fast_hash(request.new_password)
     db.commit()
+    _invalidate_status_cache()
     return {"message": "Password changed successfully"}
 
 @router.post("/mfa/setup", response_model=MFASetupResponse)
 def setup_mfa(
     device_name: str = Query(default="设备", description="设备名称"),
-    authorization: str = Header(None),
+    admin: Admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Setup MFA - generate TOTP secret and QR code (add new device)"""
-    # Verify authentication
-    admin = get_current_admin(authorization, db)
-    
     # Generate TOTP secret
     secret = pyotp.random_base32()
     
-    # Get existing secrets or initialize empty list
-    # IMPORTANT: Create a new list to ensure SQLAlchemy detects the change
-    if admin.totp_secret is None:
-        secrets_list = []
-    elif isinstance(admin.totp_secret, list):
-        # Create a deep copy to ensure SQLAlchemy detects the change
-        secrets_list = [dict(device) for device in admin.totp_secret] if admin.totp_secret else []
-    elif isinstance(admin.totp_secret, str):
-        # Try to parse as JSON (handles both single string and JSON string)
-        try:
-            # First, try to parse as JSON
-            parsed = json.loads(admin.totp_secret)
-            if isinstance(parsed, list):
-                secrets_list = parsed
-            elif isinstance(parsed, str):
-                # It's a single secret string
-                secrets_list = [{
-                    "id": "legacy",
-                    "name": "默认设备",
-                    "secret": parsed,
-                    "created_at": datetime.utcnow().isoformat()
-                }]
-            else:
-                # Unexpected format, treat as single secret
-                secrets_list = [{
-                    "id": "legacy",
-                    "name": "默认设备",
-                    "secret": admin.totp_secret,
-                    "created_at": datetime.utcnow().isoformat()
-                }]
-        except (json.JSONDecodeError, TypeError):
-            # Not valid JSON, treat as single secret string
-            secrets_list = [{
-                "id": "legacy",
-                "name": "默认设备",
-                "secret": admin.totp_secret,
-                "created_at": datetime.utcnow().isoformat()
-            }]
-    else:
-        secrets_list = []
-    
-    # Add new device
+    # Add new device（列为 MutableList，原地 append 即可被追踪）
     device_id = secrets.token_urlsafe(16)
     new_device = {
         "id": device_id,
@@ -395,72 +616,24 @@ def setup_mfa(
         "secret": secret,
         "created_at": datetime.utcnow().isoformat()
     }
-    secrets_list.append(new_device)
-    
-    # Update admin's TOTP secret
-    # Create a new list to ensure SQLAlchemy detects the change
-    admin.totp_secret = list(secrets_list)  # Create a new list object
+    if admin.totp_secret is None:
+        admin.totp_secret = []
+    admin.totp_secret.append(new_device)
     db.commit()
-    # Expire the object to force reload from database
-    db.expire(admin, ['totp_secret'])
-    db.refresh(admin)
-    
+    _invalidate_status_cache()
+
     # Log device addition
-    logger.info(f"Added device '{device_name}' with ID '{device_id}'. Total devices: {len(secrets_list)}")
-    
-    # Verify the secret was saved correctly by reading it back
-    db.refresh(admin)
-    saved_value = admin.totp_secret
-    
-    # Helper function to extract secrets from potentially nested structures
-    def extract_secrets(value):
-        """Recursively extract secrets from potentially nested structures"""
-        if isinstance(value, list):
-            return value
-        elif isinstance(value, str):
-            # Try to parse JSON recursively
-            parsed = value
-            max_attempts = 5
-            attempts = 0
-            while isinstance(parsed, str) and attempts < max_attempts:
-                try:
-                    parsed = json.loads(parsed)
-                    attempts += 1
-                except:
-                    return [{"secret": parsed}]  # Single secret string
-            return extract_secrets(parsed)  # Recursively parse
-        elif isinstance(value, dict):
-            return [value]  # Single device object
-        else:
-            return []
-    
-    extracted = extract_secrets(saved_value)
-    if len(extracted) > 0:
-        last_device = extracted[-1]
-        if isinstance(last_device, dict):
-            saved_secret = last_device.get("secret", "")
-            if saved_secret == secret:
-                logger.debug(f"Secret verified: Device '{device_name}' secret matches")
-            else:
-                logger.warning(f"Secret mismatch for device '{device_name}'")
-        else:
-            logger.warning(f"Last device is not a dict: {type(last_device)}")
-    else:
-        logger.warning("No devices found in saved value")
-    
+    logger.info("Added device '%s' with ID '%s'. Total devices: %d", device_name, device_id, len(admin.totp_secret))
+
     # Generate QR code
     totp_uri = pyotp.totp.TOTP(secret).provisioning_uri(
         name=f"Admin-{device_name}",
         issuer_name="LiteWMS"
     )
     
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(totp_uri)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
+    # segno 直接生成 1-bit PNG，不经过 PIL 的逐像素编码，比 qrcode+PIL 快一个数量级
     buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
+    segno.make(totp_uri, error='m').save(buffer, kind='png', scale=10, border=5)
     qr_code_url = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
     
     return {
@@ -470,108 +643,65 @@ def setup_mfa(
         "device_name": device_name
     }
 
+@router.get("/mfa/qr/{device_id}")
+def get_mfa_qr(device_id: str, admin: Admin = Depends(get_current_admin)):
+    """直接以 image/png 流式返回设备二维码
+
+    相比 setup 响应里的 base64 内嵌 PNG，体积小 1/3 且省去两端的
+    base64 编解码；浏览器用自身图片管线加载。
+    """
+    for device in (admin.totp_secret or []):
+        if device.get("id") == device_id:
+            secret = device.get("secret")
+            if not secret:
+                break
+            totp_uri = pyotp.totp.TOTP(secret).provisioning_uri(
+                name=f"Admin-{device.get('name', '设备')}",
+                issuer_name="LiteWMS"
+            )
+            buffer = io.BytesIO()
+            segno.make(totp_uri, error='m').save(buffer, kind='png', scale=10, border=5)
+            return Response(
+                content=buffer.getvalue(),
+                media_type="image/png",
+                headers={"Cache-Control": "private, no-store"}
+            )
+    raise HTTPException(status_code=404, detail="Device not found")
+
 @router.post("/mfa/verify", response_model=MFAVerifyResponse)
 def verify_mfa(
     request: Request,
     mfa_request: MFAVerifyRequest,
-    db: Session = Depends(get_db)
+    admin: Admin = Depends(get_admin)
 ):
     """Verify TOTP code (public endpoint, no auth required) - checks all devices, any match passes"""
     # 速率限制：只对失败的验证进行限制，成功的验证不计入限制
     # 这样可以防止暴力破解，同时不影响正常使用
     limiter = request.app.state.limiter
-    
+
     try:
-        admin = get_admin(db)
-        
-        # Force expire and refresh to get latest data from database (important when multiple devices are added)
-        db.expire(admin, ['totp_secret'])
-        db.refresh(admin)
-        
-        if not admin.totp_secret:
-            raise HTTPException(status_code=400, detail="MFA not set up")
-        
-        # Log verification attempt
-        logger.debug(f"Verifying TOTP code. Admin totp_secret type: {type(admin.totp_secret)}")
-        
-        # Log the number of devices for debugging
-        if isinstance(admin.totp_secret, list):
-            logger.debug(f"Total devices in database: {len(admin.totp_secret)}")
-        elif isinstance(admin.totp_secret, str):
-            logger.debug(f"totp_secret is a string (may need parsing)")
-        
-        # Handle both old format (single string) and new format (list)
-        # The data might be stored as a string (if column is VARCHAR) or as a list (if column is JSON)
-        # It might also be nested JSON strings due to previous bugs
-        secrets_list = []
-        if isinstance(admin.totp_secret, list):
-            secrets_list = admin.totp_secret
-            logger.debug(f"Found {len(secrets_list)} devices in list format")
-        elif isinstance(admin.totp_secret, str):
-            # Try to parse as JSON, handling nested JSON strings
-            parsed = admin.totp_secret
-            max_parse_attempts = 5  # Prevent infinite loops
-            parse_attempts = 0
-            
-            while isinstance(parsed, str) and parse_attempts < max_parse_attempts:
-                try:
-                    parsed = json.loads(parsed)
-                    parse_attempts += 1
-                except (json.JSONDecodeError, TypeError):
-                    break
-            
-            if isinstance(parsed, list):
-                secrets_list = parsed
-                logger.debug(f"Found {len(secrets_list)} devices in JSON string format (parsed {parse_attempts} time(s))")
-            elif isinstance(parsed, str):
-                # After parsing, still a string - treat as single secret
-                secrets_list = [{"secret": parsed}]
-                logger.debug(f"Found single secret after {parse_attempts} parse attempt(s)")
-            elif isinstance(parsed, dict):
-                # Single device object
-                secrets_list = [parsed]
-                logger.debug("Found single device object in JSON string")
-            else:
-                # Unexpected format, treat as single secret
-                secrets_list = [{"secret": admin.totp_secret}]
-                logger.warning(f"Found string format, but parsed to unexpected type {type(parsed)}, treating as single secret")
-        else:
-            logger.error(f"Unexpected totp_secret type: {type(admin.totp_secret)}")
-            raise HTTPException(status_code=400, detail="MFA not set up")
-        
+        # 列存储的就是规范化的设备列表，直接读取
+        secrets_list = admin.totp_secret or []
         if not secrets_list:
             raise HTTPException(status_code=400, detail="MFA not set up")
         
         # Try to verify against any of the secrets
-        logger.debug(f"Attempting to verify code against {len(secrets_list)} device(s)")
-        for idx, device in enumerate(secrets_list):
-            secret = device.get("secret") if isinstance(device, dict) else device
-            device_name = device.get("name", f"Device {idx+1}") if isinstance(device, dict) else "Unknown"
-            if secret:
-                try:
-                    logger.debug(f"Trying device {idx+1}/{len(secrets_list)}: {device_name} (secret length: {len(secret) if secret else 0})")
-                    totp = pyotp.TOTP(secret)
-                    # Increase valid_window to 2 (allows ±60 seconds) for better tolerance
-                    if totp.verify(mfa_request.totp_code, valid_window=1):
-                        logger.info(f"Verification successful with device: {device_name} (device {idx+1}/{len(secrets_list)})")
-                        # 生成短期操作 token（5 分钟有效）
-                        operation_token_expires = timedelta(minutes=5)
-                        operation_token = create_access_token(
-                            data={"type": "operation", "verified": True},
-                            expires_delta=operation_token_expires
-                        )
-                        return {
-                            "verified": True,
-                            "operation_token": operation_token,
-                            "expires_in": int(operation_token_expires.total_seconds())
-                        }
-                    else:
-                        logger.debug(f"Verification failed for device: {device_name} (device {idx+1}/{len(secrets_list)})")
-                except Exception as e:
-                    # Skip invalid secret format, try next device
-                    logger.warning(f"Error verifying secret for device {device_name}: {e}")
-                    continue
-        
+        logger.debug("Attempting to verify code against %d device(s)", len(secrets_list))
+        matched = match_totp_device(secrets_list, mfa_request.totp_code, valid_window=1)
+        if matched is not None:
+            logger.info("Verification successful with device: %s", matched.get('name', '设备'))
+            # 生成短期操作 token（5 分钟有效）
+            operation_token_expires = timedelta(minutes=5)
+            operation_token = create_access_token(
+                data={"type": "operation", "verified": True},
+                expires_delta=operation_token_expires
+            )
+            return {
+                "verified": True,
+                "operation_token": operation_token,
+                "expires_in": int(operation_token_expires.total_seconds())
+            }
+
         # None of the secrets matched - 验证失败，检查速率限制
         # 只对失败的验证进行速率限制，成功的验证不计入限制
         try:
@@ -623,60 +753,93 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.JWT_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    encoded_jwt = pyjwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
 def check_login_rate_limit(identifier: str):
     """检查登录速率限制（每个账户 5 次/5 分钟）"""
-    now = datetime.utcnow()
-    cutoff = now - timedelta(minutes=5)
-    
-    # 清理过期的失败记录
-    login_failed_attempts[identifier] = [
-        t for t in login_failed_attempts[identifier] if t > cutoff
-    ]
-    
+    if _redis_client is not None:
+        count = _login_check_script(
+            keys=[f"login_failed:{identifier}"],
+            args=[time.time(), LOGIN_FAIL_WINDOW]
+        )
+        if count >= LOGIN_FAIL_MAX:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="登录尝试过于频繁，请 5 分钟后重试"
+            )
+        return
+
+    now = time.monotonic()
+    count, window_start = login_failed_attempts.get(identifier, (0, now))
+
+    # 窗口已过期：重置计数
+    if now - window_start > LOGIN_FAIL_WINDOW:
+        login_failed_attempts.pop(identifier, None)
+        return
+
     # 检查是否超过限制
-    if len(login_failed_attempts[identifier]) >= 5:
+    if count >= LOGIN_FAIL_MAX:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="登录尝试过于频繁，请 5 分钟后重试"
         )
 
+def record_login_failure(identifier: str):
+    """记录一次登录失败"""
+    if _redis_client is not None:
+        now = time.time()
+        _login_record_script(
+            keys=[f"login_failed:{identifier}"],
+            args=[now, LOGIN_FAIL_WINDOW, f"{now}:{secrets.token_hex(4)}"]
+        )
+        return
+    now = time.monotonic()
+    count, window_start = login_failed_attempts.get(identifier, (0, now))
+    if now - window_start > LOGIN_FAIL_WINDOW:
+        count, window_start = 0, now
+    login_failed_attempts[identifier] = (count + 1, window_start)
+    _sweep_login_attempts(now)
+
+def clear_login_failures(identifier: str):
+    """登录成功后清除失败记录"""
+    if _redis_client is not None:
+        _redis_client.delete(f"login_failed:{identifier}")
+        return
+    login_failed_attempts.pop(identifier, None)
+
 @router.post("/login", response_model=LoginResponse)
-def login(
+async def login(
     login_request: LoginRequest,
     request: Request,
+    admin: Admin = Depends(get_admin),
     db: Session = Depends(get_db)
 ):
     """Login with password, returns JWT token (more secure than Basic Auth)"""
     # 获取账户标识符（使用 IP 地址）
     identifier = get_remote_address(request)
-    
+
     # 检查速率限制
     check_login_rate_limit(identifier)
-    
-    admin = get_admin(db)
-    
+
     if not admin.password_hash:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Admin password not set"
         )
     
-    # Verify password
-    if not verify_password(login_request.password, admin.password_hash):
+    # Verify password（bcrypt 冷路径放线程池，避免阻塞事件循环）
+    if not await run_in_threadpool(verify_admin_credentials, login_request.password, admin, db):
         # 记录失败的登录尝试
-        login_failed_attempts[identifier].append(datetime.utcnow())
-        
+        record_login_failure(identifier)
+
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="密码错误"
         )
-    
+
     # 登录成功，清除失败记录
-    if identifier in login_failed_attempts:
-        del login_failed_attempts[identifier]
+    clear_login_failures(identifier)
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.JWT_EXPIRE_MINUTES)
@@ -697,140 +860,62 @@ def verify_password_endpoint(admin: Admin = Depends(verify_admin_password)):
     return {"verified": True}
 
 @router.get("/mfa/devices", response_model=MFADeviceListResponse)
-def get_mfa_devices(
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
-):
+def get_mfa_devices(admin: Admin = Depends(get_current_admin)):
     """Get list of all MFA devices"""
-    admin = get_current_admin(authorization, db)
-    
-    if not admin.totp_secret:
-        logger.debug("No totp_secret found, returning empty list")
-        return {"devices": []}
-    
-    logger.debug(f"get_mfa_devices: Admin totp_secret type: {type(admin.totp_secret)}")
-    
-    # Handle both old format and new format, including nested JSON strings
-    secrets_list = []
-    if isinstance(admin.totp_secret, list):
-        secrets_list = admin.totp_secret
-        logger.debug(f"get_mfa_devices: Found {len(secrets_list)} devices in list format")
-    elif isinstance(admin.totp_secret, str):
-        # Try to parse as JSON, handling nested JSON strings
-        parsed = admin.totp_secret
-        max_parse_attempts = 5  # Prevent infinite loops
-        parse_attempts = 0
-        
-        while isinstance(parsed, str) and parse_attempts < max_parse_attempts:
-            try:
-                parsed = json.loads(parsed)
-                parse_attempts += 1
-                logger.debug(f"get_mfa_devices: Parsed JSON string (attempt {parse_attempts}), result type: {type(parsed)}")
-            except (json.JSONDecodeError, TypeError) as e:
-                logger.debug(f"get_mfa_devices: JSON parse error: {e}")
-                break
-        
-        if isinstance(parsed, list):
-            secrets_list = parsed
-            logger.debug(f"get_mfa_devices: Found {len(secrets_list)} devices after parsing JSON string")
-        elif isinstance(parsed, str):
-            # After parsing, still a string - treat as single secret
-            secrets_list = [{"secret": parsed, "id": "legacy", "name": "默认设备", "created_at": ""}]
-            logger.debug("get_mfa_devices: Parsed to single secret string")
-        elif isinstance(parsed, dict):
-            # Single device object
-            secrets_list = [parsed]
-            logger.debug("get_mfa_devices: Parsed to single device object")
-        else:
-            # Unexpected format, treat as single secret
-            secrets_list = [{"secret": admin.totp_secret, "id": "legacy", "name": "默认设备", "created_at": ""}]
-            logger.warning(f"get_mfa_devices: Unexpected parsed type {type(parsed)}, treating as single secret")
-    else:
-        logger.warning(f"get_mfa_devices: Unexpected totp_secret type: {type(admin.totp_secret)}")
-        return {"devices": []}
-    
-    # Extract devices from secrets_list
+    secrets_list = admin.totp_secret or []
+
     devices = []
     for idx, device in enumerate(secrets_list):
-        if isinstance(device, dict):
-            device_id = device.get("id", f"device_{idx}")
-            device_name = device.get("name", "设备")
-            device_secret = device.get("secret", "")
-            device_created = device.get("created_at", "")
-            
-            # Skip devices with invalid secrets
-            if not device_secret or device_secret == "null" or device_secret == "None":
-                logger.warning(f"get_mfa_devices: Skipping device {idx} with invalid secret: {device_secret}")
-                continue
-            
-            devices.append({
-                "id": device_id,
-                "name": device_name,
-                "secret": device_secret,
-                "created_at": device_created
-            })
-            logger.debug(f"get_mfa_devices: Added device {idx}: {device_name} (id: {device_id})")
-        else:
-            logger.warning(f"get_mfa_devices: Skipping non-dict device at index {idx}: {type(device)}")
-    
-    logger.debug(f"get_mfa_devices: Returning {len(devices)} devices to frontend")
+        device_secret = device.get("secret", "")
+
+        # Skip devices with invalid secrets
+        if not device_secret or device_secret == "null" or device_secret == "None":
+            logger.warning("get_mfa_devices: Skipping device %d with invalid secret: %s", idx, device_secret)
+            continue
+
+        devices.append({
+            "id": device.get("id", f"device_{idx}"),
+            "name": device.get("name", "设备"),
+            "secret": device_secret,
+            "created_at": device.get("created_at", "")
+        })
+
     return {"devices": devices}
 
 @router.delete("/mfa/devices/{device_id}")
 def delete_mfa_device(
     device_id: str,
-    authorization: str = Header(None),
+    admin: Admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Delete a specific MFA device"""
-    admin = get_current_admin(authorization, db)
-    
     if not admin.totp_secret:
         raise HTTPException(status_code=400, detail="No MFA devices found")
-    
-    if isinstance(admin.totp_secret, list):
-        # Remove device by id
-        original_count = len(admin.totp_secret)
-        admin.totp_secret = [d for d in admin.totp_secret if isinstance(d, dict) and d.get("id") != device_id]
-        
-        if len(admin.totp_secret) == original_count:
-            raise HTTPException(status_code=404, detail="Device not found")
-        
-        # If no devices left, set to None
-        if not admin.totp_secret:
-            admin.totp_secret = None
-        
-        db.commit()
-        return {"message": "Device deleted successfully"}
-    elif isinstance(admin.totp_secret, str):
-        # Legacy format: clear all
-        if device_id == "legacy":
-            admin.totp_secret = None
-            db.commit()
-            return {"message": "Device deleted successfully"}
-        else:
-            raise HTTPException(status_code=404, detail="Device not found")
-    
-    raise HTTPException(status_code=400, detail="Invalid MFA configuration")
+
+    # Remove device by id（MutableList 追踪原地 pop，无需重建列表）
+    devices = admin.totp_secret
+    idx = next((i for i, d in enumerate(devices) if d.get("id") == device_id), -1)
+    if idx < 0:
+        raise HTTPException(status_code=404, detail="Device not found")
+    devices.pop(idx)
+
+    # If no devices left, set to None
+    if not devices:
+        admin.totp_secret = None
+
+    db.commit()
+    _invalidate_status_cache()
+    return {"message": "Device deleted successfully"}
 
 @router.post("/toggle")
 def toggle_mfa(
     request: ToggleMFARequest,
-    authorization: str = Header(None),
+    admin: Admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Enable or disable MFA verification"""
-    admin = get_current_admin(authorization, db)
-    
     # 检查是否有 MFA 设备
-    mfa_count = 0
-    if admin.totp_secret:
-        if isinstance(admin.totp_secret, list):
-            mfa_count = len(admin.totp_secret)
-        elif isinstance(admin.totp_secret, str):
-            mfa_count = 1  # Legacy format
-    
-    if request.enabled and mfa_count == 0:
+    if request.enabled and not admin.totp_secret:
         raise HTTPException(
             status_code=400,
             detail="无法启用 MFA：请先添加至少一个 MFA 设备"
@@ -839,78 +924,95 @@ def toggle_mfa(
     # 更新 MFA 启用状态
     admin.mfa_enabled = request.enabled
     db.commit()
-    
-    logger.info(f"MFA {'enabled' if request.enabled else 'disabled'} by admin")
+    _invalidate_status_cache()
+    _invalidate_mfa_settings_cache()
+
+    logger.info("MFA %s by admin", 'enabled' if request.enabled else 'disabled')
     
     return {
         "message": f"MFA 已{'启用' if request.enabled else '禁用'}",
         "mfa_enabled": request.enabled
     }
 
+# /settings 结果缓存：内容基本静态（仅 update_mfa_settings/toggle_mfa 修改），
+# 但 UI 高频轮询。admin 为单例行，单条目缓存即可（Cache-Aside：写后失效）。
+_MFA_SETTINGS_TTL = 60  # 秒
+_mfa_settings_cache = None  # (expires_at, settings) 或 None
+
+def _invalidate_mfa_settings_cache():
+    global _mfa_settings_cache
+    _mfa_settings_cache = None
+
+def _mfa_settings_etag(merged: dict) -> str:
+    """弱 ETag：配置内容哈希（内容寻址，多 worker 间一致）"""
+    digest = hashlib.blake2b(
+        json.dumps(merged, sort_keys=True).encode(), digest_size=8
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+def _mfa_settings_response(request: Request, merged: dict):
+    """命中 If-None-Match 时返回 304（省去响应体序列化），否则带 ETag 返回"""
+    etag = _mfa_settings_etag(merged)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+    return ORJSONResponse(
+        {"settings": merged},
+        headers={"ETag": etag, "Cache-Control": "private, max-age=30"},
+    )
+
 @router.get("/settings")
-def get_mfa_settings(
+async def get_mfa_settings(
+    request: Request,
     authorization: str = Header(None),
     db: Session = Depends(get_db)
 ):
     """Get granular MFA settings"""
-    admin = get_current_admin(authorization, db)
-    
-    # 默认配置
-    default_settings = {
-        "inbound": True,
-        "outbound": False,
-        "transfer": True,
-        "adjust": True,
-        "category_create": True,
-        "category_update": True,
-        "category_delete": True,
-        "warehouse_create": True,
-        "warehouse_update": True,
-        "warehouse_delete": True
-    }
-    
-    if admin.mfa_settings and isinstance(admin.mfa_settings, dict):
-        # 合并默认值和现有配置
-        settings = {**default_settings, **admin.mfa_settings}
-    else:
-        settings = default_settings
-    
-    return {"settings": settings}
+    global _mfa_settings_cache
+    now = time.monotonic()
+
+    # Bearer 路径命中缓存时只做 JWT 验签（无 DB 访问）
+    if (_mfa_settings_cache is not None and _mfa_settings_cache[0] > now
+            and authorization and authorization.startswith("Bearer ")):
+        verify_jwt_token(authorization[7:])
+        return _mfa_settings_response(request, _mfa_settings_cache[1])
+
+    # 慢路径的 admin 行 SELECT 是同步 DB I/O，放到线程池避免阻塞事件循环
+    # （get_current_admin 内部的 bcrypt 冷路径已自行走线程池）
+    admin_row = await run_in_threadpool(get_admin, request, db)
+    admin = await get_current_admin(authorization, admin_row, db)
+    merged = _merged_mfa_settings(admin)
+    _mfa_settings_cache = (now + _MFA_SETTINGS_TTL, merged)
+    return _mfa_settings_response(request, merged)
 
 @router.post("/settings")
 def update_mfa_settings(
     request: MFASettingsRequest,
-    authorization: str = Header(None),
+    admin: Admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Update granular MFA settings"""
-    admin = get_current_admin(authorization, db)
-    
-    # 验证配置字段
-    valid_keys = {
-        "inbound", "outbound", "transfer", "adjust",
-        "category_create", "category_update", "category_delete",
-        "warehouse_create", "warehouse_update", "warehouse_delete"
-    }
-    
-    # 过滤无效字段，只保留有效字段
-    filtered_settings = {
-        k: bool(v) for k, v in request.settings.items() 
-        if k in valid_keys
-    }
-    
-    # 合并现有配置（如果有）
-    if admin.mfa_settings and isinstance(admin.mfa_settings, dict):
-        admin.mfa_settings.update(filtered_settings)
-    else:
-        admin.mfa_settings = filtered_settings
-    
+    # 校验已由 MFASettings 模型完成；exclude_unset 保持部分更新语义（未传的键不覆盖现有配置）
+    filtered_settings = request.settings.model_dump(exclude_unset=True)
+
+    # 服务端 JSONB || 合并：单条 UPDATE ... RETURNING 原子完成读改写，
+    # 并发的部分更新按行锁串行合并而非互相覆盖（列为 json，合并时经 jsonb 往返）
+    merged_expr = func.coalesce(
+        cast(Admin.mfa_settings, JSONB), cast({}, JSONB)
+    ).op("||")(cast(filtered_settings, JSONB))
+    stored = db.execute(
+        update(Admin)
+        .where(Admin.id == admin.id)
+        .values(mfa_settings=cast(merged_expr, JSON))
+        .returning(Admin.mfa_settings)
+    ).scalar_one()
     db.commit()
-    
-    logger.info(f"MFA settings updated: {filtered_settings}")
-    
+    _invalidate_status_cache()
+    _invalidate_mfa_settings_cache()
+
+    logger.info("MFA settings updated: %s", filtered_settings)
+
     return {
         "message": "MFA 配置已更新",
-        "settings": admin.mfa_settings
+        "settings": stored
     }
 
@@ -1,184 +1,276 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, insert, select, tuple_, union_all
+from sqlalchemy.orm import aliased
 from typing import List, Optional
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+import orjson
 from pydantic import BaseModel
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_async_db
 from app import models, schemas
 from app.routers.mfa import get_operation_token
 
 router = APIRouter()
 
+# 流式导出每批取回的行数（服务端游标）
+STREAM_BATCH_SIZE = 200
+
 @router.get("/", response_model=List[schemas.Transaction])
-def get_transactions(
+async def get_transactions(
     warehouse_id: Optional[int] = None,
     transaction_type: Optional[str] = None,
     filter_date: Optional[str] = None,
+    after_date: Optional[datetime] = None,
+    after_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 1000,
-    db: Session = Depends(get_db)
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.Transaction)
-    
-    if warehouse_id:
-        # Include transactions where warehouse_id matches OR related_warehouse_id matches
-        query = query.filter(
-            or_(
-                models.Transaction.warehouse_id == warehouse_id,
-                models.Transaction.related_warehouse_id == warehouse_id
-            )
+    """交易记录列表
+
+    分页优先使用 keyset 游标（after_date + after_id 传上一页最后一行的
+    date/id）：深翻页成本与第一页相同。offset 分页（skip）保留兼容，
+    但每页都要扫描并丢弃前面的行。
+
+    stream=1 时以 NDJSON 流式返回（服务端游标分批取行），适合导出类
+    大结果集：峰值内存与批大小而非 limit 成正比，首批行到达即开始输出。
+    """
+    conditions = []
+
+    if after_date is not None and after_id is not None:
+        # (date, id) 严格小于游标：配合 date DESC, id DESC 排序做 keyset 翻页
+        conditions.append(
+            tuple_(models.Transaction.date, models.Transaction.id)
+            < tuple_(after_date, after_id)
         )
-    
+        skip = 0  # 游标分页下忽略 offset
+
     if transaction_type:
-        query = query.filter(models.Transaction.type == transaction_type)
-    
+        conditions.append(models.Transaction.type == transaction_type)
+
     if filter_date:
-        filter_dt = datetime.fromisoformat(filter_date)
-        next_day = datetime(filter_dt.year, filter_dt.month, filter_dt.day, 23, 59, 59)
-        query = query.filter(
+        # 半开区间 [当天0点, 次日0点)：不漏 23:59:59 之后的亚秒记录，
+        # 且两端都是索引友好的范围条件
+        start = datetime.fromisoformat(filter_date).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        end = start + timedelta(days=1)
+        conditions.append(
             and_(
-                models.Transaction.date >= filter_dt,
-                models.Transaction.date <= next_day
+                models.Transaction.date >= start,
+                models.Transaction.date < end
             )
         )
-    
-    transactions = query.order_by(models.Transaction.date.desc()).offset(skip).limit(limit).all()
-    return transactions
+
+    if warehouse_id:
+        # 按仓库过滤：本仓记录 OR 调拨对端记录。
+        # 写成 UNION ALL 让规划器分别命中 ix_tx_wh_date / ix_tx_relwh_date
+        # 两个索引做范围扫描，而 OR 条件只能顺序扫描后排序。
+        q1 = select(models.Transaction).where(
+            models.Transaction.warehouse_id == warehouse_id, *conditions
+        )
+        q2 = select(models.Transaction).where(
+            models.Transaction.related_warehouse_id == warehouse_id,
+            models.Transaction.warehouse_id != warehouse_id,
+            *conditions
+        )
+        union = union_all(q1, q2).subquery()
+        tx = aliased(models.Transaction, union)
+        stmt = select(tx).order_by(tx.date.desc(), tx.id.desc()).offset(skip).limit(limit)
+    else:
+        stmt = (
+            select(models.Transaction)
+            .where(*conditions)
+            .order_by(models.Transaction.date.desc(), models.Transaction.id.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+
+    if stream:
+        async def row_stream():
+            # 依赖注入的会话在响应体迭代前就会被关闭（yield 依赖先于
+            # StreamingResponse 清理），生成器须自持会话覆盖整个迭代周期
+            async with AsyncSessionLocal() as stream_db:
+                result = await stream_db.stream(
+                    stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+                )
+                async for row in result.scalars():
+                    yield orjson.dumps(
+                        schemas.Transaction.model_validate(row).model_dump()
+                    ) + b"\n"
+
+        return StreamingResponse(row_stream(), media_type="application/x-ndjson")
+
+    result = await db.execute(stmt)
+    return result.scalars().all()
 
 @router.get("/{transaction_id}", response_model=schemas.Transaction)
-def get_transaction(transaction_id: int, db: Session = Depends(get_db)):
-    transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
+async def get_transaction(transaction_id: int, db: AsyncSession = Depends(get_async_db)):
+    transaction = await db.get(models.Transaction, transaction_id)
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     return transaction
 
 @router.post("/", response_model=schemas.Transaction)
-def create_transaction(
+async def create_transaction(
     transaction: schemas.TransactionCreate,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
-    db_transaction = models.Transaction(**transaction.dict())
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
+    # INSERT ... RETURNING 一次取回含默认值（id/date）的完整行，省去 commit 后再 SELECT
+    result = await db.execute(
+        insert(models.Transaction)
+        .values(**transaction.dict())
+        .returning(models.Transaction)
+    )
+    db_transaction = result.scalar_one()
+    await db.commit()
     return db_transaction
 
 @router.delete("/{transaction_id}")
-def delete_transaction(
+async def delete_transaction(
     transaction_id: int,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
-    db_transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
+    db_transaction = await db.get(models.Transaction, transaction_id)
     if not db_transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    db.delete(db_transaction)
-    db.commit()
+
+    await db.delete(db_transaction)
+    await db.commit()
     return {"message": "Transaction deleted successfully"}
 
 class RevertTransactionRequest(BaseModel):
     user: str
     notes: str
 
+def _freeze_specs(specs: dict) -> tuple:
+    """把 specs 字典转成可哈希的排序元组，用作查找键"""
+    return tuple(sorted((specs or {}).items()))
+
 @router.post("/{transaction_id}/revert", response_model=schemas.Transaction)
-def revert_transaction(
+async def revert_transaction(
     transaction_id: int,
     request: RevertTransactionRequest,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
     """
     撤销交易记录：更新原有记录为撤销状态，并执行反向操作来撤回该交易的所有影响
     """
-    import json
-    
-    # 获取原始交易记录
-    original_transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
+    # 获取原始交易记录（FOR UPDATE：并发撤销同一条记录时串行化，防止二次撤销）
+    original_transaction = await db.get(
+        models.Transaction, transaction_id, with_for_update=True
+    )
     if not original_transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    # 检查是否已经被撤销
+
+    # snapshot 只解析一次，后续"已撤销"判断与物品提取复用同一对象
+    snapshot = original_transaction.item_name_snapshot
     try:
-        parsed = json.loads(original_transaction.item_name_snapshot)
-        if isinstance(parsed, dict) and parsed.get('type', '').startswith('MULTI_ITEM_REVERT_'):
-            raise HTTPException(status_code=400, detail="该记录已经被撤销，无法再次撤销")
-        if isinstance(parsed, dict) and parsed.get('reverted', False):
-            raise HTTPException(status_code=400, detail="该记录已经被撤销，无法再次撤销")
-    except (json.JSONDecodeError, AttributeError):
+        parsed = orjson.loads(snapshot)
+        if not isinstance(parsed, dict):
+            parsed = None
+    except (orjson.JSONDecodeError, TypeError):
         # 旧格式，继续处理
-        pass
-    
+        parsed = None
+
+    # 检查是否已经被撤销
+    if parsed is not None and (
+        parsed.get('type', '').startswith('MULTI_ITEM_REVERT_')
+        or parsed.get('reverted', False)
+    ):
+        raise HTTPException(status_code=400, detail="该记录已经被撤销，无法再次撤销")
+
     # 解析物品信息（保存原始数据用于显示）
-    original_items = []
-    try:
-        parsed = json.loads(original_transaction.item_name_snapshot)
-        if isinstance(parsed, dict) and 'items' in parsed and isinstance(parsed['items'], list):
-            items = parsed['items']
-            original_items = parsed['items']  # 保存原始数据
-        elif isinstance(parsed, dict) and 'original_items' in parsed and isinstance(parsed['original_items'], list):
-            # 如果已经是撤销记录，使用 original_items
-            items = parsed['original_items']
-            original_items = parsed['original_items']
-        else:
-            # 旧格式：单物品
+    if parsed is not None and isinstance(parsed.get('items'), list):
+        items = parsed['items']
+        original_items = parsed['items']  # 保存原始数据
+    elif parsed is not None and isinstance(parsed.get('original_items'), list):
+        # 如果已经是撤销记录，使用 original_items
+        items = parsed['original_items']
+        original_items = parsed['original_items']
+    else:
+        # 旧格式：单物品（"品类名 - {specs JSON}" 或纯品类名）
+        try:
             items = [{
-                'category_name': original_transaction.item_name_snapshot.split(' - ')[0] if ' - ' in original_transaction.item_name_snapshot else original_transaction.item_name_snapshot,
-                'specs': json.loads(original_transaction.item_name_snapshot.split(' - ')[1]) if ' - ' in original_transaction.item_name_snapshot else {},
+                'category_name': snapshot.split(' - ')[0] if ' - ' in snapshot else snapshot,
+                'specs': orjson.loads(snapshot.split(' - ')[1]) if ' - ' in snapshot else {},
+                'quantity': original_transaction.quantity,
+                'quantity_diff': original_transaction.quantity
+            }]
+        except Exception:
+            # 解析失败，使用原始数据
+            items = [{
+                'category_name': snapshot,
+                'specs': {},
                 'quantity': original_transaction.quantity,
                 'quantity_diff': original_transaction.quantity
             }]
-            original_items = items.copy()
-    except:
-        # 解析失败，使用原始数据
-        items = [{
-            'category_name': original_transaction.item_name_snapshot,
-            'specs': {},
-            'quantity': original_transaction.quantity,
-            'quantity_diff': original_transaction.quantity
-        }]
         original_items = items.copy()
-    
+
+    # 批量预取：一次查出所有涉及的品类，以及相关仓库（含调拨对端）下这些品类的
+    # 全部库存物品，避免循环内每个物品 1-2 次 SELECT 的 N+1 往返
+    category_names = {item_data.get('category_name', '') for item_data in items}
+    cat_by_name = {
+        c.name: c for c in (await db.execute(
+            select(models.Category).where(models.Category.name.in_(category_names))
+        )).scalars()
+    }
+
+    warehouse_ids = {original_transaction.warehouse_id}
+    if original_transaction.related_warehouse_id:
+        warehouse_ids.add(original_transaction.related_warehouse_id)
+    inventory = {}
+    if cat_by_name:
+        rows = (await db.execute(
+            select(models.InventoryItem).where(
+                and_(
+                    models.InventoryItem.warehouse_id.in_(warehouse_ids),
+                    models.InventoryItem.category_id.in_(
+                        [c.id for c in cat_by_name.values()]
+                    )
+                )
+            # FOR UPDATE：锁住待改的库存行，避免并发下 read-modify-write 丢失更新。
+            # 整个 handler 在 session 的同一事务里，末尾 commit 一次性释放行锁
+            ).with_for_update()
+        )).scalars()
+        inventory = {
+            (row.warehouse_id, row.category_id, _freeze_specs(row.specs)): row
+            for row in rows
+        }
+
     # 根据交易类型执行反向操作
     revert_items = []
     total_revert_quantity = 0
-    
+
     for item_data in items:
         specs = item_data.get('specs', {})
         quantity = item_data.get('quantity', 0) or item_data.get('quantity_diff', 0)
         category_name = item_data.get('category_name', '')
-        
+
         # 查找对应的品类
-        category = db.query(models.Category).filter(models.Category.name == category_name).first()
+        category = cat_by_name.get(category_name)
         if not category:
             raise HTTPException(status_code=404, detail=f"Category '{category_name}' not found")
-        
+
         # 查找对应的库存物品（根据仓库、品类和规格）
-        warehouse_items = db.query(models.InventoryItem).filter(
-            and_(
-                models.InventoryItem.warehouse_id == original_transaction.warehouse_id,
-                models.InventoryItem.category_id == category.id
-            )
-        ).all()
-        
-        # 找到规格匹配的物品
-        target_item = None
-        for item in warehouse_items:
-            if item.specs == specs:
-                target_item = item
-                break
-        
+        target_item = inventory.get(
+            (original_transaction.warehouse_id, category.id, _freeze_specs(specs))
+        )
+
         if not target_item:
             raise HTTPException(
-                status_code=404, 
+                status_code=404,
                 detail=f"Item not found: category={category_name}, specs={specs}, warehouse_id={original_transaction.warehouse_id}"
             )
-        
+
         # 根据交易类型执行反向操作
         if original_transaction.type == 'IN':
             # 入库 -> 出库（减少库存）
@@ -201,20 +293,12 @@ def revert_transaction(
                 # 调拨出 -> 调拨入（增加当前仓库库存）
                 revert_quantity = abs(quantity)
                 target_item.quantity += abs(quantity)
-                
+
                 # 如果有目标仓库，也需要处理目标仓库的库存
                 if original_transaction.related_warehouse_id:
-                    target_warehouse_items = db.query(models.InventoryItem).filter(
-                        and_(
-                            models.InventoryItem.warehouse_id == original_transaction.related_warehouse_id,
-                            models.InventoryItem.category_id == category.id
-                        )
-                    ).all()
-                    target_warehouse_item = None
-                    for item in target_warehouse_items:
-                        if item.specs == specs:
-                            target_warehouse_item = item
-                            break
+                    target_warehouse_item = inventory.get(
+                        (original_transaction.related_warehouse_id, category.id, _freeze_specs(specs))
+                    )
                     if target_warehouse_item:
                         target_warehouse_item.quantity = max(0, target_warehouse_item.quantity - abs(quantity))
                         target_warehouse_item.updated_at = datetime.utcnow()
@@ -222,46 +306,30 @@ def revert_transaction(
                 # 调拨入 -> 调拨出（减少当前仓库库存）
                 revert_quantity = -abs(quantity)
                 target_item.quantity = max(0, target_item.quantity - abs(quantity))
-                
+
                 # 如果有源仓库，也需要处理源仓库的库存
                 if original_transaction.related_warehouse_id:
-                    source_warehouse_items = db.query(models.InventoryItem).filter(
-                        and_(
-                            models.InventoryItem.warehouse_id == original_transaction.related_warehouse_id,
-                            models.InventoryItem.category_id == category.id
-                        )
-                    ).all()
-                    source_warehouse_item = None
-                    for item in source_warehouse_items:
-                        if item.specs == specs:
-                            source_warehouse_item = item
-                            break
+                    source_warehouse_item = inventory.get(
+                        (original_transaction.related_warehouse_id, category.id, _freeze_specs(specs))
+                    )
                     if source_warehouse_item:
                         source_warehouse_item.quantity += abs(quantity)
                         source_warehouse_item.updated_at = datetime.utcnow()
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported transaction type: {original_transaction.type}")
-        
+
         target_item.updated_at = datetime.utcnow()
         total_revert_quantity += revert_quantity
-        
+
         revert_items.append({
             'category_name': category_name,
             'specs': specs,
             'quantity': abs(revert_quantity),
             'quantity_diff': revert_quantity
         })
-    
+
     # 更新原有记录为撤销状态
-    # 保留原始数据，但添加撤销标记
-    try:
-        original_parsed = json.loads(original_transaction.item_name_snapshot)
-        if not isinstance(original_parsed, dict):
-            original_parsed = {}
-    except (json.JSONDecodeError, AttributeError):
-        original_parsed = {}
-    
-    # 更新 item_name_snapshot，添加撤销标记和撤销信息
+    # 更新 item_name_snapshot，添加撤销标记和撤销信息（保留原始数据）
     updated_snapshot = {
         'type': f'MULTI_ITEM_REVERT_{original_transaction.type}',
         'items': revert_items,  # 撤销操作的数据（用于库存操作）
@@ -277,16 +345,17 @@ def revert_transaction(
         'original_quantity': original_transaction.quantity,
         'original_total_quantity': abs(original_transaction.quantity) if original_transaction.quantity != 0 else 0
     }
-    
+
     # 更新原有记录
-    original_transaction.item_name_snapshot = json.dumps(updated_snapshot)
+    # Python 侧契约（schemas.Transaction / JSONBSnapshot）是 JSON 字符串，
+    # 这里必须序列化后再赋值，绑定时由 JSONBSnapshot 还原为 JSONB
+    original_transaction.item_name_snapshot = orjson.dumps(updated_snapshot).decode()
     original_transaction.quantity = total_revert_quantity  # 更新数量为反向数量
     original_transaction.user = request.user  # 更新操作人为撤销操作人
     original_transaction.notes = f"撤销操作：{request.notes}"  # 更新备注为撤销备注
     # 保持 date 不变，确保记录位置不变
-    
-    db.commit()
-    db.refresh(original_transaction)
-    
-    return original_transaction
 
+    # expire_on_commit=False：对象在 commit 后仍有效，无需 refresh 补一条 SELECT
+    await db.commit()
+
+    return original_transaction
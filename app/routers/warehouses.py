@@ -1,73 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, exists, func, select
 from typing import List, Optional
-from app.database import get_db
+import hashlib
+import orjson
+from app.database import get_async_db
 from app import models, schemas
 from app.routers.mfa import get_operation_token
 
 router = APIRouter()
 
 @router.get("/", response_model=List[schemas.Warehouse])
-def get_warehouses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    warehouses = db.query(models.Warehouse).offset(skip).limit(limit).all()
-    return warehouses
+async def get_warehouses(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    result = await db.execute(select(models.Warehouse).offset(skip).limit(limit))
+    payload = [{"id": w.id, "name": w.name} for w in result.scalars()]
+
+    # 弱 ETag：内容哈希（行无 updated_at，进程内版本号在多 worker 下不一致），
+    # 命中 If-None-Match 时返回 304，省去响应体序列化与传输
+    body = orjson.dumps(payload)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, max-age=30"},
+    )
 
 @router.get("/{warehouse_id}", response_model=schemas.Warehouse)
-def get_warehouse(warehouse_id: int, db: Session = Depends(get_db)):
-    warehouse = db.query(models.Warehouse).filter(models.Warehouse.id == warehouse_id).first()
+async def get_warehouse(warehouse_id: int, db: AsyncSession = Depends(get_async_db)):
+    warehouse = await db.get(models.Warehouse, warehouse_id)
     if not warehouse:
         raise HTTPException(status_code=404, detail="Warehouse not found")
     return warehouse
 
 @router.post("/", response_model=schemas.Warehouse)
-def create_warehouse(
+async def create_warehouse(
     warehouse: schemas.WarehouseCreate,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
+    # expire_on_commit=False 下 flush 已填充 id，commit 后无需 refresh 补 SELECT
     db_warehouse = models.Warehouse(**warehouse.dict())
     db.add(db_warehouse)
-    db.commit()
-    db.refresh(db_warehouse)
+    await db.commit()
     return db_warehouse
 
 @router.put("/{warehouse_id}", response_model=schemas.Warehouse)
-def update_warehouse(
+async def update_warehouse(
     warehouse_id: int,
     warehouse: schemas.WarehouseUpdate,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
-    db_warehouse = db.query(models.Warehouse).filter(models.Warehouse.id == warehouse_id).first()
+    db_warehouse = await db.get(models.Warehouse, warehouse_id)
     if not db_warehouse:
         raise HTTPException(status_code=404, detail="Warehouse not found")
-    
+
     for key, value in warehouse.dict().items():
         setattr(db_warehouse, key, value)
-    
-    db.commit()
-    db.refresh(db_warehouse)
+
+    await db.commit()
     return db_warehouse
 
 @router.delete("/{warehouse_id}")
-def delete_warehouse(
+async def delete_warehouse(
     warehouse_id: int,
     authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: Optional[dict] = Depends(get_operation_token)
 ):
-    db_warehouse = db.query(models.Warehouse).filter(models.Warehouse.id == warehouse_id).first()
-    if not db_warehouse:
-        raise HTTPException(status_code=404, detail="Warehouse not found")
-    
-    # Check if warehouse has items
-    item_count = db.query(models.InventoryItem).filter(models.InventoryItem.warehouse_id == warehouse_id).count()
-    if item_count > 0:
+    # 条件 DELETE：仅当仓库下无库存时删除，成功路径一次往返
+    # （NOT EXISTS 探到首行即止，无需 COUNT(*) 精确计数）
+    result = await db.execute(
+        delete(models.Warehouse).where(
+            models.Warehouse.id == warehouse_id,
+            ~exists(
+                select(models.InventoryItem.id)
+                .where(models.InventoryItem.warehouse_id == warehouse_id)
+            ),
+        )
+    )
+
+    if result.rowcount == 0:
+        # 失败路径才回查，区分 404（仓库不存在）与 400（仍有库存）
+        warehouse_exists = (await db.execute(
+            select(models.Warehouse.id).where(models.Warehouse.id == warehouse_id)
+        )).first()
+        if not warehouse_exists:
+            raise HTTPException(status_code=404, detail="Warehouse not found")
+        item_count = (await db.execute(
+            select(func.count()).select_from(models.InventoryItem)
+            .where(models.InventoryItem.warehouse_id == warehouse_id)
+        )).scalar_one()
         raise HTTPException(status_code=400, detail=f"Warehouse has {item_count} items, cannot delete")
-    
-    db.delete(db_warehouse)
-    db.commit()
-    return {"message": "Warehouse deleted successfully"}
 
+    await db.commit()
+    return {"message": "Warehouse deleted successfully"}
@@ -5,24 +5,31 @@ from app.database import SessionLocal
 from app import models
 from datetime import datetime
 
-def seed_data():
-    db = SessionLocal()
-    
+def seed_data(db=None):
+    """初始化种子数据
+
+    db: 传入调用方的会话时复用之（事务由调用方提交，如 reset_database
+    让清空与种子同一事务落盘）；不传则自建会话并自行提交。
+    """
+    owns_session = db is None
+    if owns_session:
+        db = SessionLocal()
+
     try:
-        # Check if data already exists
-        if db.query(models.Warehouse).count() > 0:
-            print("数据已存在，跳过种子数据初始化")
-            return
-        
+        # 按名称幂等：已存在的行复用，缺失的行补齐——部分初始化后重跑也能补全，
+        # 且免去 COUNT(*) 全表扫描（name 列无唯一约束，无法用 ON CONFLICT）
+        wh_by_name = {w.name: w for w in db.query(models.Warehouse).all()}
+        cat_by_name = {c.name: c for c in db.query(models.Category).all()}
+        has_items = db.query(models.InventoryItem.id).first() is not None
+
         # 1. 创建仓库
-        wh_a = models.Warehouse(name="仓库 A (Warehouse A)")
-        wh_b = models.Warehouse(name="仓库 B (Warehouse B)")
-        db.add(wh_a)
-        db.add(wh_b)
+        wh_a = wh_by_name.get("仓库 A (Warehouse A)") or models.Warehouse(name="仓库 A (Warehouse A)")
+        wh_b = wh_by_name.get("仓库 B (Warehouse B)") or models.Warehouse(name="仓库 B (Warehouse B)")
+        db.add_all([wh_a, wh_b])
         db.flush()  # 获取 ID
-        
+
         # 2. 创建品类
-        fiber_cat = models.Category(
+        fiber_cat = cat_by_name.get("光纤跳线 (Fiber)") or models.Category(
             name="光纤跳线 (Fiber)",
             attributes=[
                 {"name": "模式 (Mode)", "options": ["单模 (SM)", "多模 (MM)", "OM3", "OM4", "OS2"]},
@@ -32,7 +39,7 @@ def seed_data():
             ]
         )
         
-        copper_cat = models.Category(
+        copper_cat = cat_by_name.get("网线 (Copper)") or models.Category(
             name="网线 (Copper)",
             attributes=[
                 {"name": "类型 (Cat)", "options": ["Cat5e", "Cat6", "Cat6a", "Cat7", "Cat8"]},
@@ -42,7 +49,7 @@ def seed_data():
             ]
         )
         
-        mpo_cat = models.Category(
+        mpo_cat = cat_by_name.get("MPO主干光纤 (MPO)") or models.Category(
             name="MPO主干光纤 (MPO)",
             attributes=[
                 {"name": "芯数 (Cores)", "options": ["8芯", "12芯", "16芯", "24芯"]},
@@ -53,9 +60,7 @@ def seed_data():
             ]
         )
         
-        db.add(fiber_cat)
-        db.add(copper_cat)
-        db.add(mpo_cat)
+        db.add_all([fiber_cat, copper_cat, mpo_cat])
         db.flush()
         
         # 3. 创建库存项
@@ -155,19 +160,27 @@ def seed_data():
             }
         ]
         
-        for item_data in items_data:
-            item = models.InventoryItem(**item_data, updated_at=datetime.utcnow())
-            db.add(item)
-        
-        db.commit()
+        # 批量插入：单条多行 INSERT，避免逐对象 flush 并回取默认值。
+        # 库存项无业务唯一键可比对，仅在空表时插入
+        if not has_items:
+            now = datetime.utcnow()
+            db.bulk_insert_mappings(
+                models.InventoryItem,
+                [{**item_data, "updated_at": now} for item_data in items_data],
+            )
+
+        if owns_session:
+            db.commit()
         print("种子数据初始化成功！")
-        
+
     except Exception as e:
-        db.rollback()
+        if owns_session:
+            db.rollback()
         print(f"种子数据初始化失败: {e}")
         raise
     finally:
-        db.close()
+        if owns_session:
+            db.close()
 
 if __name__ == "__main__":
     seed_data()
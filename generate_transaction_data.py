@@ -17,14 +17,18 @@
 """
 import sys
 import os
+import argparse
+import csv
+import io
 import random
-import json
+import orjson
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 from app import models
@@ -69,22 +73,55 @@ REASONS = ["库存盘点", "仓库整理", "需求调整", "错误修正", "系
 APPROVERS = ["经理", "主管", "负责人"]
 
 
-def generate_transaction_data():
-    """生成操作记录模拟数据"""
+def _freeze_specs(specs: dict) -> tuple:
+    """把 specs 字典转成可哈希的排序元组，用作查找键"""
+    return tuple(sorted((specs or {}).items()))
+
+
+def generate_transaction_data(fast: bool = False, rebuild_indexes: bool = True):
+    """生成操作记录模拟数据
+
+    fast=True 时关闭同步提交并把 transactions 临时转为 UNLOGGED，
+    写入阶段绕过 fsync/WAL 开销（结束后转回 LOGGED）。
+    UNLOGGED 表在数据库崩溃时会被清空，仅适用于测试库。
+
+    rebuild_indexes=True（默认）时先删除 transactions 的二级索引、
+    载入完成后按原定义重建：COPY 期间不再逐行维护索引，批量重建更快。
+    """
     engine = create_engine(settings.DATABASE_URL)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
-    
+
     try:
         print("=" * 60)
         print("开始生成操作记录模拟数据")
         print("=" * 60)
-        
+
+        if fast:
+            print("\n⚡ 快速模式：synchronous_commit=off + UNLOGGED")
+            db.execute(text("SET synchronous_commit = off"))
+            db.execute(text("ALTER TABLE transactions SET UNLOGGED"))
+            db.commit()
+
         # 1. 清除所有现有操作记录
+        # TRUNCATE 整表清空不走逐行 MVCC/WAL，比 DELETE 快几个数量级
         print("\n1. 清除现有操作记录...")
-        deleted_count = db.query(models.Transaction).delete()
+        db.execute(text("TRUNCATE transactions RESTART IDENTITY"))
         db.commit()
-        print(f"   已删除 {deleted_count} 条操作记录")
+        print("   已清空 transactions 表")
+
+        saved_indexes = []
+        if rebuild_indexes:
+            # 先删二级索引（保留主键），载入后整体重建
+            saved_indexes = db.execute(text(
+                "SELECT indexname, indexdef FROM pg_indexes "
+                "WHERE tablename = 'transactions' AND indexname NOT LIKE '%_pkey'"
+            )).fetchall()
+            for index_name, _ in saved_indexes:
+                db.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+            db.commit()
+            if saved_indexes:
+                print(f"   已暂时删除 {len(saved_indexes)} 个二级索引（载入后重建）")
         
         # 2. 获取现有数据
         print("\n2. 获取现有数据...")
@@ -107,6 +144,21 @@ def generate_transaction_data():
         print(f"   找到 {len(warehouses)} 个仓库")
         print(f"   找到 {len(categories)} 个品类")
         print(f"   找到 {len(items)} 个物品")
+
+        # 预建索引：品类按 id、物品按仓库分桶、(仓库, 品类, 规格) 定位物品，
+        # 循环内以 O(1) 字典探测取代对全量列表的线性扫描
+        cat_by_id = {c.id: c for c in categories}
+        items_by_wh = defaultdict(list)
+        for item in items:
+            items_by_wh[item.warehouse_id].append(item)
+        item_lookup = {
+            (i.warehouse_id, i.category_id, _freeze_specs(i.specs)): i
+            for i in items
+        }
+        # 每个仓库对应的"其他仓库"列表（调拨目标候选），避免循环内反复推导
+        others_by_wh = {
+            w.id: [x for x in warehouses if x.id != w.id] for w in warehouses
+        }
         
         # 3. 生成模拟数据
         print("\n3. 生成模拟操作记录...")
@@ -116,20 +168,56 @@ def generate_transaction_data():
         start_date = end_date - timedelta(days=30)
         
         transactions_created = 0
-        
+
+        # 批量插入缓冲：攒满一批后经 COPY ... FROM STDIN 一次性载入。
+        # COPY 跳过逐条 INSERT 的 SQL 解析/规划，是 PG 批量加载的最快路径；
+        # CSV 文本格式由 csv 模块处理转义，空字段即 NULL
+        BATCH_SIZE = 1000
+        rows = []
+        copy_columns = (
+            'warehouse_id', 'related_warehouse_id', 'item_id',
+            'item_name_snapshot', 'quantity', 'date', 'user', 'notes', 'type'
+        )
+        copy_sql = (
+            'COPY transactions (warehouse_id, related_warehouse_id, item_id, '
+            'item_name_snapshot, quantity, date, "user", notes, type) '
+            'FROM STDIN WITH (FORMAT csv)'
+        )
+
+        def flush_rows():
+            if not rows:
+                return
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for row in rows:
+                writer.writerow([row[col] for col in copy_columns])
+            buf.seek(0)
+            # copy_expert 走 session 当前事务的底层 psycopg2 连接，
+            # 仍由末尾的 db.commit() 统一提交
+            cursor = db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(copy_sql, buf)
+            finally:
+                cursor.close()
+            rows.clear()
+
         # 按日期生成记录
+        trans_type_pool = ('IN', 'OUT', 'ADJUST', 'TRANSFER')
         current_date = start_date
         while current_date <= end_date:
             # 每天生成 5-15 条记录
             daily_count = random.randint(5, 15)
-            
-            for _ in range(daily_count):
-                # 随机选择操作类型
-                trans_type = random.choice(['IN', 'OUT', 'ADJUST', 'TRANSFER'])
-                
-                # 随机选择仓库和物品
-                warehouse = random.choice(warehouses)
-                warehouse_items = [item for item in items if item.warehouse_id == warehouse.id]
+
+            # 每天一次性批量抽样（类型/仓库/操作人），
+            # 免去循环内逐条的 random.choice 调用开销
+            day_types = random.choices(trans_type_pool, k=daily_count)
+            day_warehouses = random.choices(warehouses, k=daily_count)
+            day_operators = random.choices(OPERATORS, k=daily_count)
+
+            for trans_type, warehouse, operator in zip(
+                day_types, day_warehouses, day_operators
+            ):
+                warehouse_items = items_by_wh.get(warehouse.id, [])
                 
                 if not warehouse_items:
                     continue
@@ -152,7 +240,6 @@ def generate_transaction_data():
                 num_items = random.randint(1, min(5, len(warehouse_items)))
                 selected_items = random.sample(warehouse_items, num_items)
                 
-                operator = random.choice(OPERATORS)
                 transaction_date = current_date + timedelta(
                     hours=random.randint(8, 18),
                     minutes=random.randint(0, 59)
@@ -186,7 +273,7 @@ def generate_transaction_data():
                     note_template = random.choice(ADJUST_NOTES)
                     notes = note_template.format(reason=reason)
                 else:  # TRANSFER
-                    target_warehouse = random.choice([w for w in warehouses if w.id != warehouse.id])
+                    target_warehouse = random.choice(others_by_wh[warehouse.id])
                     reason = random.choice(REASONS)
                     approver = random.choice(APPROVERS)
                     note_template = random.choice(TRANSFER_NOTES)
@@ -198,7 +285,7 @@ def generate_transaction_data():
                 
                 for item in selected_items:
                     # 获取品类名称
-                    category = next((c for c in categories if c.id == item.category_id), None)
+                    category = cat_by_id.get(item.category_id)
                     category_name = category.name if category else "未知品类"
                     
                     # 生成数量
@@ -220,10 +307,12 @@ def generate_transaction_data():
                             continue  # 跳过库存为0的物品（理论上不应该出现，因为已过滤）
                         quantity = random.randint(1, max_qty)
                     
+                    # ADJUST 的快照项用 quantity_diff 键，直接按目标格式构建，
+                    # 免去之后整列表重建一遍
                     items_data.append({
                         "category_name": category_name,
                         "specs": item.specs,
-                        "quantity": quantity
+                        ("quantity_diff" if trans_type == 'ADJUST' else "quantity"): quantity
                     })
                     
                     if trans_type == 'ADJUST':
@@ -242,35 +331,27 @@ def generate_transaction_data():
                     snapshot_type = 'MULTI_ITEM_OUTBOUND'
                 elif trans_type == 'ADJUST':
                     snapshot_type = 'MULTI_ITEM_ADJUST'
-                    # 调整需要 quantity_diff
-                    items_data_with_diff = []
-                    for item_data in items_data:
-                        items_data_with_diff.append({
-                            "category_name": item_data["category_name"],
-                            "specs": item_data["specs"],
-                            "quantity_diff": item_data["quantity"]
-                        })
-                    items_data = items_data_with_diff
                 else:  # TRANSFER
                     snapshot_type = 'MULTI_ITEM_TRANSFER'
                 
-                item_name_snapshot = json.dumps({
+                # orjson（Rust 实现）序列化比 stdlib json 快数倍
+                item_name_snapshot = orjson.dumps({
                     "type": snapshot_type,
                     "items": items_data,
                     "total_quantity": abs(total_quantity),
                     "total_quantity_diff": total_quantity if trans_type == 'ADJUST' else None
-                })
+                }).decode()
                 
                 # 使用第一个物品的ID作为主item_id
                 primary_item_id = selected_items[0].id
                 
                 # 创建交易记录
                 if trans_type == 'TRANSFER':
-                    # 调拨需要创建两条记录
-                    target_warehouse = random.choice([w for w in warehouses if w.id != warehouse.id])
-                    
+                    # 调拨需要创建两条记录（target_warehouse 已在备注分支选定，
+                    # 此处复用，修复此前两处独立抽样可能不一致的问题）
+
                     # 源仓库记录（调拨出）
-                    transaction_out = models.Transaction(
+                    rows.append(dict(
                         warehouse_id=warehouse.id,
                         related_warehouse_id=target_warehouse.id,
                         item_id=primary_item_id,
@@ -280,21 +361,18 @@ def generate_transaction_data():
                         user=operator,
                         notes=notes,
                         type='TRANSFER'
-                    )
-                    db.add(transaction_out)
-                    
+                    ))
+
                     # 目标仓库记录（调拨入）
                     # 查找目标仓库中对应的物品，如果不存在则使用源物品ID
-                    target_item = next(
-                        (item for item in items 
-                         if item.warehouse_id == target_warehouse.id 
-                         and item.category_id == selected_items[0].category_id
-                         and item.specs == selected_items[0].specs),
-                        None
-                    )
+                    target_item = item_lookup.get((
+                        target_warehouse.id,
+                        selected_items[0].category_id,
+                        _freeze_specs(selected_items[0].specs),
+                    ))
                     target_item_id = target_item.id if target_item else primary_item_id
                     
-                    transaction_in = models.Transaction(
+                    rows.append(dict(
                         warehouse_id=target_warehouse.id,
                         related_warehouse_id=warehouse.id,
                         item_id=target_item_id,
@@ -304,8 +382,7 @@ def generate_transaction_data():
                         user=operator,
                         notes=notes,
                         type='TRANSFER'
-                    )
-                    db.add(transaction_in)
+                    ))
                     transactions_created += 2
                 else:
                     # 其他类型只需要一条记录
@@ -313,8 +390,9 @@ def generate_transaction_data():
                     if trans_type == 'OUT':
                         quantity_value = -abs(total_quantity)
                     
-                    transaction = models.Transaction(
+                    rows.append(dict(
                         warehouse_id=warehouse.id,
+                        related_warehouse_id=None,
                         item_id=primary_item_id,
                         item_name_snapshot=item_name_snapshot,
                         quantity=quantity_value,
@@ -322,15 +400,30 @@ def generate_transaction_data():
                         user=operator,
                         notes=notes,
                         type=trans_type
-                    )
-                    db.add(transaction)
+                    ))
                     transactions_created += 1
-            
+
+                if len(rows) >= BATCH_SIZE:
+                    flush_rows()
+
             # 移动到下一天
             current_date += timedelta(days=1)
-        
+
         # 提交所有更改
+        flush_rows()
         db.commit()
+
+        if saved_indexes:
+            # 按原定义重建索引（批量构建快于载入期间的逐行维护）
+            print(f"\n4. 重建 {len(saved_indexes)} 个索引...")
+            for _, indexdef in saved_indexes:
+                db.execute(text(indexdef))
+            db.commit()
+
+        if fast:
+            # 写入完成后恢复 LOGGED（会为全表补写 WAL，一次性成本）
+            db.execute(text("ALTER TABLE transactions SET LOGGED"))
+            db.commit()
         
         print(f"\n✅ 成功生成 {transactions_created} 条操作记录")
         print(f"   日期范围：{start_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}")
@@ -348,8 +441,24 @@ def generate_transaction_data():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='生成操作记录模拟数据')
+    parser.add_argument(
+        '--fast',
+        action='store_true',
+        help='快速模式：synchronous_commit=off + 临时 UNLOGGED（仅测试库使用）'
+    )
+    parser.add_argument(
+        '--keep-indexes',
+        action='store_true',
+        help='载入期间保留二级索引（默认：先删除、载入后重建）'
+    )
+    args = parser.parse_args()
+
     try:
-        generate_transaction_data()
+        generate_transaction_data(
+            fast=args.fast,
+            rebuild_indexes=not args.keep_indexes
+        )
     except KeyboardInterrupt:
         print("\n\n操作已取消")
         sys.exit(1)
@@ -12,8 +12,8 @@
 
 import sys
 import os
-import json
 import argparse
+import orjson
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
@@ -21,46 +21,52 @@ from typing import Optional, List, Dict, Any
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select
 from app.database import SessionLocal, engine
 from app import models
 
 def parse_item_snapshot(item_name_snapshot: str) -> Dict[str, Any]:
-    """解析 item_name_snapshot，支持新旧格式"""
-    try:
-        parsed = json.loads(item_name_snapshot)
-        if isinstance(parsed, dict):
-            # 新格式：JSON 对象
-            if 'items' in parsed and isinstance(parsed['items'], list):
-                return {
-                    'type': parsed.get('type', 'UNKNOWN'),
-                    'items': parsed['items'],
-                    'is_reverted': parsed.get('reverted', False) or parsed.get('type', '').startswith('MULTI_ITEM_REVERT_'),
-                    'original_items': parsed.get('original_items', parsed['items'])
-                }
-            else:
-                # 可能是旧格式的 JSON
-                return {
-                    'type': 'SINGLE_ITEM',
-                    'items': [{
-                        'category_name': parsed.get('category_name', ''),
-                        'specs': parsed.get('specs', {}),
-                        'quantity': parsed.get('quantity', 0),
-                        'quantity_diff': parsed.get('quantity_diff', parsed.get('quantity', 0))
-                    }],
-                    'is_reverted': False,
-                    'original_items': None
-                }
+    """解析 item_name_snapshot，支持新旧格式
+
+    先看首个非空白字符是否 '{'，是才尝试 orjson.loads；
+    旧格式字符串直接走分割路径，省掉每条旧记录一次异常构造的开销
+    """
+    parsed = None
+    if isinstance(item_name_snapshot, str) and item_name_snapshot.lstrip()[:1] == '{':
+        try:
+            parsed = orjson.loads(item_name_snapshot)
+        except orjson.JSONDecodeError:
+            parsed = None
+
+    if isinstance(parsed, dict):
+        # 新格式：JSON 对象
+        if 'items' in parsed and isinstance(parsed['items'], list):
+            return {
+                'type': parsed.get('type', 'UNKNOWN'),
+                'items': parsed['items'],
+                'is_reverted': parsed.get('reverted', False) or parsed.get('type', '').startswith('MULTI_ITEM_REVERT_'),
+                'original_items': parsed.get('original_items', parsed['items'])
+            }
         else:
-            # 不是字典，可能是字符串
-            raise ValueError("Not a dict")
-    except (json.JSONDecodeError, ValueError, TypeError):
+            # 可能是旧格式的 JSON
+            return {
+                'type': 'SINGLE_ITEM',
+                'items': [{
+                    'category_name': parsed.get('category_name', ''),
+                    'specs': parsed.get('specs', {}),
+                    'quantity': parsed.get('quantity', 0),
+                    'quantity_diff': parsed.get('quantity_diff', parsed.get('quantity', 0))
+                }],
+                'is_reverted': False,
+                'original_items': None
+            }
+    else:
         # 旧格式：字符串 "品类名 - {...specs...}"
         try:
             if ' - ' in item_name_snapshot:
                 parts = item_name_snapshot.split(' - ', 1)
                 category_name = parts[0]
-                specs = json.loads(parts[1]) if len(parts) > 1 else {}
+                specs = orjson.loads(parts[1]) if len(parts) > 1 else {}
             else:
                 category_name = item_name_snapshot
                 specs = {}
@@ -85,14 +91,80 @@ def parse_item_snapshot(item_name_snapshot: str) -> Dict[str, Any]:
                 'original_items': None
             }
 
-def reverse_transaction_effect(db: Session, transaction: models.Transaction) -> bool:
+def _freeze_specs(specs: dict) -> tuple:
+    """把 specs 字典转成可哈希的排序元组，用作查找键"""
+    return tuple(sorted((specs or {}).items()))
+
+# 反向调拨的符号表：(是否调拨出, 是否撤销记录) -> (本仓库符号, 对端仓库符号)
+# 调拨出的反向是本仓库 +、对端 -；调拨入相反；撤销记录再整体取反
+TRANSFER_SIGNS = {
+    (True, False): (+1, -1),
+    (True, True): (-1, +1),
+    (False, False): (-1, +1),
+    (False, True): (+1, -1),
+}
+
+def _apply_signed(item: models.InventoryItem, sign: int, amount: int, now: datetime):
+    """按符号增减库存并刷新时间戳，减少时不跌破 0"""
+    if sign > 0:
+        item.quantity += amount
+    else:
+        item.quantity = max(0, item.quantity - amount)
+    item.updated_at = now
+
+def _prefetch_inventory(db: Session, transaction: models.Transaction, items: List[Dict[str, Any]]):
+    """一次性取出交易涉及的品类与相关仓库（含调拨对端）的库存物品
+
+    返回 (cat_by_name, inventory)：
+    - cat_by_name: 品类名 -> Category
+    - inventory: (warehouse_id, category_id, 冻结规格) -> InventoryItem
+
+    两条查询取代循环内每个物品 1-2 次 SELECT 加 Python 线性匹配的 N+1 往返。
+    """
+    names = {d.get('category_name', '') for d in items if d.get('category_name')}
+    cat_by_name = {}
+    if names:
+        cat_by_name = {
+            c.name: c for c in db.query(models.Category)
+            .filter(models.Category.name.in_(names)).all()
+        }
+
+    inventory = {}
+    if cat_by_name:
+        warehouse_ids = {transaction.warehouse_id}
+        if transaction.related_warehouse_id:
+            warehouse_ids.add(transaction.related_warehouse_id)
+        # FOR UPDATE 一次锁住全部待改行：防止与并发写入互相丢失更新，
+        # 锁在调用方 commit/rollback 时释放
+        rows = db.query(models.InventoryItem).filter(
+            and_(
+                models.InventoryItem.warehouse_id.in_(warehouse_ids),
+                models.InventoryItem.category_id.in_(
+                    [c.id for c in cat_by_name.values()]
+                )
+            )
+        ).with_for_update().all()
+        inventory = {
+            (row.warehouse_id, row.category_id, _freeze_specs(row.specs)): row
+            for row in rows
+        }
+    return cat_by_name, inventory
+
+def reverse_transaction_effect(
+    db: Session,
+    transaction: models.Transaction,
+    parsed: Optional[Dict[str, Any]] = None
+) -> bool:
     """
     反向交易记录的影响，恢复库存状态
     返回 True 如果成功，False 如果失败
+
+    调用方可传入已解析的快照（parsed），避免同一条记录在一次操作里反复 json.loads
     """
     try:
-        parsed = parse_item_snapshot(transaction.item_name_snapshot)
-        
+        if parsed is None:
+            parsed = parse_item_snapshot(transaction.item_name_snapshot)
+
         # 如果是撤销记录，需要反向撤销操作（即恢复原操作）
         if parsed['is_reverted']:
             # 撤销记录：需要恢复原始操作的影响
@@ -107,37 +179,34 @@ def reverse_transaction_effect(db: Session, transaction: models.Transaction) ->
         if not items:
             print(f"⚠️  警告：交易记录 {transaction.id} 无法解析物品信息")
             return False
-        
+
+        # 批量预取品类与库存，循环内只做字典探测
+        cat_by_name, inventory = _prefetch_inventory(db, transaction, items)
+
+        # 单次取时间戳：同一操作内所有受影响行共享同一 updated_at，便于审计对账
+        now = datetime.utcnow()
+
         # 处理每个物品
         for item_data in items:
             category_name = item_data.get('category_name', '')
             specs = item_data.get('specs', {})
             quantity = item_data.get('quantity', 0) or item_data.get('quantity_diff', 0)
-            
+
             if not category_name:
                 print(f"⚠️  警告：物品缺少品类名称，跳过")
                 continue
-            
+
             # 查找品类
-            category = db.query(models.Category).filter(models.Category.name == category_name).first()
+            category = cat_by_name.get(category_name)
             if not category:
                 print(f"❌ 错误：找不到品类 '{category_name}'")
                 return False
-            
+
             # 查找库存物品
-            warehouse_items = db.query(models.InventoryItem).filter(
-                and_(
-                    models.InventoryItem.warehouse_id == transaction.warehouse_id,
-                    models.InventoryItem.category_id == category.id
-                )
-            ).all()
-            
-            target_item = None
-            for item in warehouse_items:
-                if item.specs == specs:
-                    target_item = item
-                    break
-            
+            target_item = inventory.get(
+                (transaction.warehouse_id, category.id, _freeze_specs(specs))
+            )
+
             if not target_item:
                 print(f"❌ 错误：找不到库存物品 (品类: {category_name}, 规格: {specs}, 仓库: {transaction.warehouse_id})")
                 return False
@@ -169,77 +238,22 @@ def reverse_transaction_effect(db: Session, transaction: models.Transaction) ->
                     # 普通记录：反向调整
                     target_item.quantity = max(0, target_item.quantity - quantity_diff)
             elif transaction.type == 'TRANSFER':
-                # 调拨 -> 反向调拨
-                if transaction.quantity < 0:
-                    # 调拨出
-                    if reverse_again:
-                        # 撤销记录：恢复调拨出（减少当前仓库，增加目标仓库）
-                        target_item.quantity = max(0, target_item.quantity - abs(quantity))
-                        if transaction.related_warehouse_id:
-                            # 处理目标仓库
-                            target_warehouse_items = db.query(models.InventoryItem).filter(
-                                and_(
-                                    models.InventoryItem.warehouse_id == transaction.related_warehouse_id,
-                                    models.InventoryItem.category_id == category.id
-                                )
-                            ).all()
-                            for item in target_warehouse_items:
-                                if item.specs == specs:
-                                    item.quantity += abs(quantity)
-                                    item.updated_at = datetime.utcnow()
-                                    break
-                    else:
-                        # 普通记录：反向调拨出（增加当前仓库，减少目标仓库）
-                        target_item.quantity += abs(quantity)
-                        if transaction.related_warehouse_id:
-                            # 处理目标仓库
-                            target_warehouse_items = db.query(models.InventoryItem).filter(
-                                and_(
-                                    models.InventoryItem.warehouse_id == transaction.related_warehouse_id,
-                                    models.InventoryItem.category_id == category.id
-                                )
-                            ).all()
-                            for item in target_warehouse_items:
-                                if item.specs == specs:
-                                    item.quantity = max(0, item.quantity - abs(quantity))
-                                    item.updated_at = datetime.utcnow()
-                                    break
-                else:
-                    # 调拨入
-                    if reverse_again:
-                        # 撤销记录：恢复调拨入（增加当前仓库，减少源仓库）
-                        target_item.quantity += abs(quantity)
-                        if transaction.related_warehouse_id:
-                            # 处理源仓库
-                            source_warehouse_items = db.query(models.InventoryItem).filter(
-                                and_(
-                                    models.InventoryItem.warehouse_id == transaction.related_warehouse_id,
-                                    models.InventoryItem.category_id == category.id
-                                )
-                            ).all()
-                            for item in source_warehouse_items:
-                                if item.specs == specs:
-                                    item.quantity = max(0, item.quantity - abs(quantity))
-                                    item.updated_at = datetime.utcnow()
-                                    break
-                    else:
-                        # 普通记录：反向调拨入（减少当前仓库，增加源仓库）
-                        target_item.quantity = max(0, target_item.quantity - abs(quantity))
-                        if transaction.related_warehouse_id:
-                            # 处理源仓库
-                            source_warehouse_items = db.query(models.InventoryItem).filter(
-                                and_(
-                                    models.InventoryItem.warehouse_id == transaction.related_warehouse_id,
-                                    models.InventoryItem.category_id == category.id
-                                )
-                            ).all()
-                            for item in source_warehouse_items:
-                                if item.specs == specs:
-                                    item.quantity += abs(quantity)
-                                    item.updated_at = datetime.utcnow()
-                                    break
-            
-            target_item.updated_at = datetime.utcnow()
+                # 调拨 -> 反向调拨：四种情况（出/入 × 普通/撤销）只差符号，查表统一处理
+                sign_self, sign_related = TRANSFER_SIGNS[
+                    (transaction.quantity < 0, reverse_again)
+                ]
+                _apply_signed(target_item, sign_self, abs(quantity), now)
+                if transaction.related_warehouse_id:
+                    # 处理对端仓库（调拨出的目标仓库 / 调拨入的源仓库）
+                    other_item = inventory.get((
+                        transaction.related_warehouse_id,
+                        category.id,
+                        _freeze_specs(specs),
+                    ))
+                    if other_item:
+                        _apply_signed(other_item, sign_related, abs(quantity), now)
+
+            target_item.updated_at = now
         
         return True
     except Exception as e:
@@ -248,14 +262,21 @@ def reverse_transaction_effect(db: Session, transaction: models.Transaction) ->
         traceback.print_exc()
         return False
 
-def apply_transaction_effect(db: Session, transaction: models.Transaction) -> bool:
+def apply_transaction_effect(
+    db: Session,
+    transaction: models.Transaction,
+    parsed: Optional[Dict[str, Any]] = None
+) -> bool:
     """
     应用交易记录的影响到库存
     用于修改交易记录后重新应用
+
+    parsed 语义同 reverse_transaction_effect：传入则跳过重复解析
     """
     try:
-        parsed = parse_item_snapshot(transaction.item_name_snapshot)
-        
+        if parsed is None:
+            parsed = parse_item_snapshot(transaction.item_name_snapshot)
+
         # 只处理非撤销记录
         if parsed['is_reverted']:
             print(f"⚠️  警告：跳过撤销记录的应用")
@@ -265,36 +286,33 @@ def apply_transaction_effect(db: Session, transaction: models.Transaction) -> bo
         if not items:
             print(f"⚠️  警告：交易记录 {transaction.id} 无法解析物品信息")
             return False
-        
+
+        # 批量预取品类与库存，循环内只做字典探测
+        cat_by_name, inventory = _prefetch_inventory(db, transaction, items)
+
+        # 单次取时间戳：同一操作内所有受影响行共享同一 updated_at，便于审计对账
+        now = datetime.utcnow()
+
         # 处理每个物品
         for item_data in items:
             category_name = item_data.get('category_name', '')
             specs = item_data.get('specs', {})
             quantity = item_data.get('quantity', 0) or item_data.get('quantity_diff', 0)
-            
+
             if not category_name:
                 continue
-            
+
             # 查找品类
-            category = db.query(models.Category).filter(models.Category.name == category_name).first()
+            category = cat_by_name.get(category_name)
             if not category:
                 print(f"❌ 错误：找不到品类 '{category_name}'")
                 return False
-            
+
             # 查找库存物品
-            warehouse_items = db.query(models.InventoryItem).filter(
-                and_(
-                    models.InventoryItem.warehouse_id == transaction.warehouse_id,
-                    models.InventoryItem.category_id == category.id
-                )
-            ).all()
-            
-            target_item = None
-            for item in warehouse_items:
-                if item.specs == specs:
-                    target_item = item
-                    break
-            
+            target_item = inventory.get(
+                (transaction.warehouse_id, category.id, _freeze_specs(specs))
+            )
+
             if not target_item:
                 print(f"❌ 错误：找不到库存物品 (品类: {category_name}, 规格: {specs})")
                 return False
@@ -312,34 +330,28 @@ def apply_transaction_effect(db: Session, transaction: models.Transaction) -> bo
                     # 调拨出：减少当前仓库，增加目标仓库
                     target_item.quantity = max(0, target_item.quantity - abs(quantity))
                     if transaction.related_warehouse_id:
-                        target_warehouse_items = db.query(models.InventoryItem).filter(
-                            and_(
-                                models.InventoryItem.warehouse_id == transaction.related_warehouse_id,
-                                models.InventoryItem.category_id == category.id
-                            )
-                        ).all()
-                        for item in target_warehouse_items:
-                            if item.specs == specs:
-                                item.quantity += abs(quantity)
-                                item.updated_at = datetime.utcnow()
-                                break
+                        other_item = inventory.get((
+                            transaction.related_warehouse_id,
+                            category.id,
+                            _freeze_specs(specs),
+                        ))
+                        if other_item:
+                            other_item.quantity += abs(quantity)
+                            other_item.updated_at = now
                 else:
                     # 调拨入：增加当前仓库，减少源仓库
                     target_item.quantity += abs(quantity)
                     if transaction.related_warehouse_id:
-                        source_warehouse_items = db.query(models.InventoryItem).filter(
-                            and_(
-                                models.InventoryItem.warehouse_id == transaction.related_warehouse_id,
-                                models.InventoryItem.category_id == category.id
-                            )
-                        ).all()
-                        for item in source_warehouse_items:
-                            if item.specs == specs:
-                                item.quantity = max(0, item.quantity - abs(quantity))
-                                item.updated_at = datetime.utcnow()
-                                break
+                        other_item = inventory.get((
+                            transaction.related_warehouse_id,
+                            category.id,
+                            _freeze_specs(specs),
+                        ))
+                        if other_item:
+                            other_item.quantity = max(0, other_item.quantity - abs(quantity))
+                            other_item.updated_at = now
             
-            target_item.updated_at = datetime.utcnow()
+            target_item.updated_at = now
         
         return True
     except Exception as e:
@@ -348,23 +360,44 @@ def apply_transaction_effect(db: Session, transaction: models.Transaction) -> bo
         traceback.print_exc()
         return False
 
-def show_transaction(db: Session, transaction_id: int):
-    """显示交易记录详情"""
-    transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
-    if not transaction:
-        print(f"❌ 交易记录 {transaction_id} 不存在")
-        return
-    
-    warehouse = db.query(models.Warehouse).filter(models.Warehouse.id == transaction.warehouse_id).first()
-    warehouse_name = warehouse.name if warehouse else f"ID: {transaction.warehouse_id}"
-    
-    related_warehouse_name = None
-    if transaction.related_warehouse_id:
-        related_warehouse = db.query(models.Warehouse).filter(models.Warehouse.id == transaction.related_warehouse_id).first()
-        related_warehouse_name = related_warehouse.name if related_warehouse else f"ID: {transaction.related_warehouse_id}"
-    
-    parsed = parse_item_snapshot(transaction.item_name_snapshot)
-    
+# 每次 CLI 运行内的仓库名缓存：同一仓库跨多次展示只查一次
+_warehouse_names: Dict[int, str] = {}
+
+def _warehouse_name(db: Session, warehouse_id: Optional[int], also=()) -> Optional[str]:
+    """取仓库名，带进程内缓存；also 里的 ID 会顺带在同一条 IN 查询里预取
+
+    找不到的仓库返回 "ID: <id>" 占位（与原展示逻辑一致），且负缓存避免重查。
+    """
+    if warehouse_id is None:
+        return None
+    missing = {
+        wid for wid in {warehouse_id, *also}
+        if wid is not None and wid not in _warehouse_names
+    }
+    if missing:
+        rows = db.query(models.Warehouse).filter(
+            models.Warehouse.id.in_(missing)
+        ).all()
+        _warehouse_names.update({w.id: w.name for w in rows})
+        for wid in missing - set(_warehouse_names):
+            _warehouse_names[wid] = f"ID: {wid}"
+    return _warehouse_names[warehouse_id]
+
+def show_transaction(db: Session, transaction: models.Transaction, parsed: Optional[Dict[str, Any]] = None):
+    """显示交易记录详情
+
+    直接接收已加载的 Transaction 实例，调用方不必为展示再发一次 SELECT；
+    parsed 可选传入已解析的快照，省一次 json.loads
+    """
+    # 两个仓库名一次 IN 查询取回，重复展示时直接命中缓存
+    warehouse_name = _warehouse_name(
+        db, transaction.warehouse_id, also=(transaction.related_warehouse_id,)
+    )
+    related_warehouse_name = _warehouse_name(db, transaction.related_warehouse_id)
+
+    if parsed is None:
+        parsed = parse_item_snapshot(transaction.item_name_snapshot)
+
     print(f"\n{'='*60}")
     print(f"交易记录详情 (ID: {transaction.id})")
     print(f"{'='*60}")
@@ -385,26 +418,30 @@ def show_transaction(db: Session, transaction_id: int):
         print(f"     数量: {item.get('quantity', 0)} / 变动: {item.get('quantity_diff', 0)}")
     print(f"{'='*60}\n")
 
-def delete_transaction(db: Session, transaction_id: int, reason: Optional[str] = None):
-    """删除交易记录并恢复库存"""
+def delete_transaction(db: Session, transaction_id: int, reason: Optional[str] = None, yes: bool = False):
+    """删除交易记录并恢复库存（yes=True 时跳过交互确认，供脚本化调用）"""
     transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
     if not transaction:
         print(f"❌ 交易记录 {transaction_id} 不存在")
         return False
     
+    # 快照只在入口解析一次，展示与反向操作复用同一份字典
+    parsed = parse_item_snapshot(transaction.item_name_snapshot)
+
     print(f"\n准备删除交易记录 {transaction_id}...")
-    show_transaction(db, transaction_id)
-    
+    show_transaction(db, transaction, parsed=parsed)
+
     # 确认
-    confirm = input("确认删除此交易记录？(输入 'yes' 确认): ")
-    if confirm.lower() != 'yes':
-        print("❌ 操作已取消")
-        return False
-    
+    if not yes:
+        confirm = input("确认删除此交易记录？(输入 'yes' 确认): ")
+        if confirm.lower() != 'yes':
+            print("❌ 操作已取消")
+            return False
+
     try:
         # 反向交易影响
         print("\n正在反向交易影响，恢复库存...")
-        if not reverse_transaction_effect(db, transaction):
+        if not reverse_transaction_effect(db, transaction, parsed=parsed):
             print("❌ 反向交易影响失败，操作已取消")
             db.rollback()
             return False
@@ -425,49 +462,104 @@ def delete_transaction(db: Session, transaction_id: int, reason: Optional[str] =
         traceback.print_exc()
         return False
 
+def bulk_delete_transactions(db: Session, transaction_ids: List[int], yes: bool = False):
+    """批量删除交易记录并恢复库存
+
+    一次 IN 查询取回全部记录，逐条反向后单事务提交：
+    任何一条失败则整体回滚，库存不会停在中间状态
+    """
+    transactions = db.query(models.Transaction).filter(
+        models.Transaction.id.in_(transaction_ids)
+    ).all()
+
+    found_ids = {t.id for t in transactions}
+    for tid in transaction_ids:
+        if tid not in found_ids:
+            print(f"⚠️  警告：交易记录 {tid} 不存在，跳过")
+
+    if not transactions:
+        print("❌ 没有可删除的交易记录")
+        return False
+
+    print(f"\n准备删除 {len(transactions)} 条交易记录: {sorted(found_ids)}")
+    if not yes:
+        try:
+            confirm = input("确认批量删除？(输入 'yes' 确认): ")
+        except EOFError:
+            # stdin 已被 ID 读取耗尽（管道场景）时无法确认，按取消处理
+            print("\n❌ stdin 已到 EOF，无法交互确认，操作已取消（请使用 --yes）")
+            return False
+        if confirm.lower() != 'yes':
+            print("❌ 操作已取消")
+            return False
+
+    try:
+        for transaction in transactions:
+            print(f"正在反向交易记录 {transaction.id} 的影响...")
+            if not reverse_transaction_effect(db, transaction):
+                print(f"❌ 交易记录 {transaction.id} 反向失败，整批回滚")
+                db.rollback()
+                return False
+            db.delete(transaction)
+
+        db.commit()
+        print(f"✅ 已删除 {len(transactions)} 条交易记录，库存已恢复")
+        return True
+    except Exception as e:
+        print(f"❌ 批量删除失败: {e}")
+        db.rollback()
+        import traceback
+        traceback.print_exc()
+        return False
+
 def modify_transaction(
     db: Session,
     transaction_id: int,
     quantity: Optional[int] = None,
     user: Optional[str] = None,
     notes: Optional[str] = None,
-    date: Optional[str] = None
+    date: Optional[str] = None,
+    yes: bool = False
 ):
-    """修改交易记录并更新库存"""
+    """修改交易记录并更新库存（yes=True 时跳过交互确认）"""
     transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
     if not transaction:
         print(f"❌ 交易记录 {transaction_id} 不存在")
         return False
     
+    # 快照只在入口解析一次，后续展示/反向/应用共用
+    parsed = parse_item_snapshot(transaction.item_name_snapshot)
+
     print(f"\n准备修改交易记录 {transaction_id}...")
-    show_transaction(db, transaction_id)
-    
+    show_transaction(db, transaction, parsed=parsed)
+
     # 检查是否有修改
     if not any([quantity is not None, user, notes, date]):
         print("⚠️  没有指定要修改的字段")
         return False
     
     # 确认
-    confirm = input("确认修改此交易记录？(输入 'yes' 确认): ")
-    if confirm.lower() != 'yes':
-        print("❌ 操作已取消")
-        return False
+    if not yes:
+        confirm = input("确认修改此交易记录？(输入 'yes' 确认): ")
+        if confirm.lower() != 'yes':
+            print("❌ 操作已取消")
+            return False
     
     try:
         # 如果修改了数量，需要反向原操作，然后应用新操作
         if quantity is not None and quantity != transaction.quantity:
             print("\n正在反向原交易影响...")
-            if not reverse_transaction_effect(db, transaction):
+            if not reverse_transaction_effect(db, transaction, parsed=parsed):
                 print("❌ 反向原交易影响失败，操作已取消")
                 db.rollback()
                 return False
-            
+
             # 更新数量
             transaction.quantity = quantity
-            
-            # 应用新操作
+
+            # 应用新操作（快照未变，复用同一份解析结果）
             print("正在应用新交易影响...")
-            if not apply_transaction_effect(db, transaction):
+            if not apply_transaction_effect(db, transaction, parsed=parsed):
                 print("❌ 应用新交易影响失败，操作已取消")
                 db.rollback()
                 return False
@@ -487,7 +579,7 @@ def modify_transaction(
         
         print(f"✅ 交易记录 {transaction_id} 已修改")
         print("\n修改后的记录:")
-        show_transaction(db, transaction_id)
+        show_transaction(db, transaction, parsed=parsed)
         return True
     except Exception as e:
         print(f"❌ 修改失败: {e}")
@@ -503,20 +595,31 @@ def list_transactions(
     limit: int = 20
 ):
     """列出交易记录"""
-    query = db.query(models.Transaction)
-    
+    # 只读列表：Core 列投影取轻量 Row 元组，跳过整份 ORM 对象
+    # 的实例化与身份映射登记（列表只展示标量列）
+    stmt = select(
+        models.Transaction.id,
+        models.Transaction.type,
+        models.Transaction.date,
+        models.Transaction.quantity,
+        models.Transaction.user,
+        models.Transaction.notes,
+    )
+
     if warehouse_id:
-        query = query.filter(
+        stmt = stmt.where(
             or_(
                 models.Transaction.warehouse_id == warehouse_id,
                 models.Transaction.related_warehouse_id == warehouse_id
             )
         )
-    
+
     if transaction_type:
-        query = query.filter(models.Transaction.type == transaction_type)
-    
-    transactions = query.order_by(models.Transaction.date.desc()).limit(limit).all()
+        stmt = stmt.where(models.Transaction.type == transaction_type)
+
+    transactions = db.execute(
+        stmt.order_by(models.Transaction.date.desc()).limit(limit)
+    ).all()
     
     print(f"\n{'='*80}")
     print(f"交易记录列表 (显示最近 {len(transactions)} 条)")
@@ -524,11 +627,18 @@ def list_transactions(
     print(f"{'ID':<6} {'类型':<8} {'日期':<12} {'数量':<8} {'操作人':<15} {'备注':<30}")
     print(f"{'-'*80}")
     
+    # 预编译行模板，整批拼好后一次输出：逐行 print 的 I/O 刷写合并为一次
+    row_fmt = "{:<6} {:<8} {:<12} {:<8} {:<15} {:<30}".format
+    lines = []
     for t in transactions:
         notes_display = t.notes[:27] + "..." if len(t.notes) > 30 else t.notes
-        date_display = t.date.strftime("%Y-%m-%d")
-        print(f"{t.id:<6} {t.type:<8} {date_display:<12} {t.quantity:<8} {t.user:<15} {notes_display:<30}")
-    
+        lines.append(row_fmt(
+            t.id, t.type, t.date.strftime("%Y-%m-%d"),
+            t.quantity, t.user, notes_display
+        ))
+    if lines:
+        print("\n".join(lines))
+
     print(f"{'='*80}\n")
 
 def main():
@@ -539,7 +649,12 @@ def main():
     delete_parser = subparsers.add_parser('delete', help='删除交易记录')
     delete_parser.add_argument('transaction_id', type=int, help='交易记录 ID')
     delete_parser.add_argument('--reason', type=str, help='删除原因')
-    
+    delete_parser.add_argument('--yes', action='store_true', help='跳过交互确认（脚本化使用）')
+
+    # bulk-delete 命令
+    bulk_delete_parser = subparsers.add_parser('bulk-delete', help='批量删除交易记录（ID 从 stdin 逐行读取，必须配合 --yes）')
+    bulk_delete_parser.add_argument('--yes', action='store_true', help='确认执行批量删除（ID 占用 stdin，无法交互确认，必须显式传入）')
+
     # modify 命令
     modify_parser = subparsers.add_parser('modify', help='修改交易记录')
     modify_parser.add_argument('transaction_id', type=int, help='交易记录 ID')
@@ -547,6 +662,7 @@ def main():
     modify_parser.add_argument('--user', type=str, help='新操作人')
     modify_parser.add_argument('--notes', type=str, help='新备注')
     modify_parser.add_argument('--date', type=str, help='新日期 (YYYY-MM-DD 或 ISO 格式)')
+    modify_parser.add_argument('--yes', action='store_true', help='跳过交互确认（脚本化使用）')
     
     # show 命令
     show_parser = subparsers.add_parser('show', help='显示交易记录详情')
@@ -567,7 +683,20 @@ def main():
     db = SessionLocal()
     try:
         if args.command == 'delete':
-            delete_transaction(db, args.transaction_id, args.reason)
+            delete_transaction(db, args.transaction_id, args.reason, yes=args.yes)
+        elif args.command == 'bulk-delete':
+            # ID 从 stdin 读取后管道已到 EOF，input() 确认必然失败，
+            # 因此该子命令只支持显式 --yes，缺省时直接报错而非抛 EOFError
+            if not args.yes:
+                print("❌ bulk-delete 从 stdin 读取 ID，无法交互确认；请显式传入 --yes")
+                return
+            transaction_ids = [
+                int(line) for line in sys.stdin.read().split() if line.strip()
+            ]
+            if not transaction_ids:
+                print("❌ 未从 stdin 读到任何交易记录 ID")
+            else:
+                bulk_delete_transactions(db, transaction_ids, yes=args.yes)
         elif args.command == 'modify':
             modify_transaction(
                 db,
@@ -575,10 +704,17 @@ def main():
                 quantity=args.quantity,
                 user=args.user,
                 notes=args.notes,
-                date=args.date
+                date=args.date,
+                yes=args.yes
             )
         elif args.command == 'show':
-            show_transaction(db, args.transaction_id)
+            transaction = db.query(models.Transaction).filter(
+                models.Transaction.id == args.transaction_id
+            ).first()
+            if not transaction:
+                print(f"❌ 交易记录 {args.transaction_id} 不存在")
+            else:
+                show_transaction(db, transaction)
         elif args.command == 'list':
             list_transactions(
                 db,
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+将 transactions.item_name_snapshot 从 TEXT 迁移为 JSONB，并创建 GIN 索引
+
+JSONB 列让 Postgres 可以直接按快照键（如 reverted、品类名）做服务端过滤，
+应用侧也不再需要逐行解析 JSON。旧的纯文本快照（非 JSON 内容）
+迁移时转为 JSON 字符串值存储。
+
+使用方法：
+    python migrate_snapshot_to_jsonb.py
+"""
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def migrate_snapshot_to_jsonb():
+    """转换列类型并建 GIN 索引"""
+    engine = create_engine(settings.DATABASE_URL)
+
+    try:
+        with engine.connect() as conn:
+            print("正在转换 item_name_snapshot 为 JSONB ...")
+            # 非法 JSON（旧纯文本格式）回退为 JSON 字符串值
+            conn.execute(text("""
+                CREATE OR REPLACE FUNCTION _snapshot_to_jsonb(t text) RETURNS jsonb AS $$
+                BEGIN
+                    RETURN t::jsonb;
+                EXCEPTION WHEN others THEN
+                    RETURN to_jsonb(t);
+                END;
+                $$ LANGUAGE plpgsql IMMUTABLE
+            """))
+            conn.execute(text("""
+                ALTER TABLE transactions
+                ALTER COLUMN item_name_snapshot TYPE jsonb
+                USING _snapshot_to_jsonb(item_name_snapshot)
+            """))
+            conn.execute(text("DROP FUNCTION _snapshot_to_jsonb(text)"))
+            print("正在创建 GIN 索引 ix_tx_snapshot_gin ...")
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_tx_snapshot_gin
+                ON transactions USING gin (item_name_snapshot jsonb_path_ops)
+            """))
+            conn.commit()
+            print("✅ 迁移完成")
+    except Exception as e:
+        print(f"❌ 错误：{e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    migrate_snapshot_to_jsonb()
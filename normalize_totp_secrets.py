@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+将 admin.totp_secret 归一化为标准的设备列表格式
+
+历史数据中该列可能存在多种格式：
+- 纯字符串（最早的单密钥格式）
+- JSON 字符串（甚至多层嵌套编码的 JSON 字符串）
+- 单个设备 dict
+- 标准的设备 dict 列表
+
+运行本脚本后统一为 [{"secret": "...", "name": "...", "id": "...", "created_at": "..."}, ...]
+或 NULL，之后应用代码不再需要多格式解码。
+
+使用方法：
+    python normalize_totp_secrets.py
+"""
+import sys
+import os
+import json
+from datetime import datetime
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app import models
+
+def extract_secrets(raw):
+    """把任意历史格式解码为设备 dict 列表（空则返回 []）"""
+    data = raw
+    # 兼容多层 JSON 字符串嵌套，最多解 5 层
+    for _ in range(5):
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except (json.JSONDecodeError, ValueError):
+                break
+        else:
+            break
+
+    if not data:
+        return []
+    if isinstance(data, str):
+        # 无法再解码的纯字符串：视为最早的单密钥格式
+        return [{
+            "secret": data,
+            "name": "默认设备",
+            "id": "legacy",
+            "created_at": datetime.utcnow().isoformat(),
+        }]
+    if isinstance(data, dict):
+        return [data]
+    if isinstance(data, list):
+        return [device for device in data if isinstance(device, dict) and device.get("secret")]
+    return []
+
+def normalize_totp_secrets():
+    """归一化所有 admin 行的 totp_secret"""
+    db = SessionLocal()
+    try:
+        admins = db.query(models.Admin).all()
+        changed = 0
+        for admin in admins:
+            secrets_list = extract_secrets(admin.totp_secret)
+            normalized = secrets_list if secrets_list else None
+            if normalized != admin.totp_secret:
+                admin.totp_secret = normalized
+                changed += 1
+                print(f"  admin id={admin.id}: 归一化为 {len(secrets_list)} 个设备")
+        db.commit()
+        print(f"✅ 完成，共更新 {changed} 行")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 错误：{e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("正在归一化 admin.totp_secret ...")
+    normalize_totp_secrets()
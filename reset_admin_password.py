@@ -17,13 +17,15 @@
 import sys
 import os
 import getpass
+import hmac
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
 from app.config import settings
-from app.routers.mfa import get_password_hash
+from app.routers.mfa import compute_fast_hash, get_password_hash
 
 def reset_admin_password():
     """重置管理员密码"""
@@ -47,7 +49,8 @@ def reset_admin_password():
     # 确认密码
     confirm_password = getpass.getpass("确认密码: ")
     
-    if new_password != confirm_password:
+    # 常数时间比较，避免 != 短路泄露前缀匹配长度的时序信息
+    if not hmac.compare_digest(new_password.encode(), confirm_password.encode()):
         print("❌ 错误：两次输入的密码不一致")
         sys.exit(1)
     
@@ -56,29 +59,30 @@ def reset_admin_password():
         engine = create_engine(settings.DATABASE_URL)
         
         with engine.connect() as conn:
-            # 检查 admin 表是否存在
-            result = conn.execute(text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = 'admin'
-                )
-            """))
-            
-            if not result.fetchone()[0]:
-                print("❌ 错误：admin 表不存在，请先运行应用初始化数据库")
-                sys.exit(1)
-            
             # 生成密码哈希
             password_hash = get_password_hash(new_password)
-            
-            # 更新密码
-            conn.execute(text("""
-                UPDATE admin 
-                SET password_hash = :password_hash,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = (SELECT id FROM admin LIMIT 1)
-            """), {"password_hash": password_hash})
-            
+            # 同步重算快速哈希（未配置 PASSWORD_PEPPER 时为 NULL）：
+            # 否则登录快路径仍比对旧密码的 HMAC，新密码会被拒绝
+            fast_hash = compute_fast_hash(new_password)
+
+            # 直接更新，表不存在时由 ProgrammingError 兜底；
+            # 省掉每次执行前对 information_schema 的目录扫描往返
+            try:
+                result = conn.execute(text("""
+                    UPDATE admin
+                    SET password_hash = :password_hash,
+                        password_fast_hash = :fast_hash,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = (SELECT id FROM admin LIMIT 1)
+                """), {"password_hash": password_hash, "fast_hash": fast_hash})
+            except ProgrammingError:
+                print("❌ 错误：admin 表不存在，请先运行应用初始化数据库")
+                sys.exit(1)
+
+            if result.rowcount == 0:
+                print("❌ 错误：admin 表中没有管理员记录，请先运行应用初始化数据库")
+                sys.exit(1)
+
             conn.commit()
             
             print()
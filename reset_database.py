@@ -5,118 +5,147 @@
 
 使用方法:
     python reset_database.py
+    python reset_database.py --yes [--keep-admin] [--no-seed]
 """
 
+import argparse
 import sys
-from sqlalchemy import text
-from app.database import SessionLocal, engine, Base
-from app import models
-from app.seed_data import seed_data
 
-def reset_database(keep_admin: bool = False, seed_data_flag: bool = True):
+def reset_database(keep_admin: bool = False, seed_data_flag: bool = True, yes: bool = False):
     """
     重置数据库到初始状态
-    
+
     Args:
         keep_admin: 如果为 True，保留 admin 表的数据（MFA 配置等）
         seed_data_flag: 如果为 True，重新初始化种子数据
+        yes: 跳过所有交互提示，直接使用入参（脚本/CI 场景）
     """
-    db = SessionLocal()
-    
-    try:
-        print("=" * 80)
-        print("数据库重置脚本")
-        print("=" * 80)
-        
+    # stdin 非 TTY（cron/CI/重定向）时无法交互确认。破坏性操作绝不默认放行：
+    # 必须显式传 --yes，否则直接报错退出（与基线 input() 抛 EOFError 同样失败安全）
+    if not yes and not sys.stdin.isatty():
+        print("❌ 错误：stdin 不是终端，无法交互确认重置操作")
+        print("   脚本化执行请显式传入 --yes（可配合 --keep-admin / --no-seed）")
+        sys.exit(1)
+    non_interactive = yes
+
+    print("=" * 80)
+    print("数据库重置脚本")
+    print("=" * 80)
+
+    if non_interactive:
+        print("\n非交互模式：跳过确认提示")
+    else:
         # 交互式选择：是否保留管理员配置
         print("\n请选择操作选项：")
         print("1. 清空所有数据（包括管理员配置）")
         print("2. 保留管理员配置（MFA 设置等）")
         admin_choice = input("\n请选择 (1/2，默认 1): ").strip()
         keep_admin = admin_choice == '2'
-        
-        if keep_admin:
-            print("\n✅ 将保留管理员配置（MFA 设置等）")
-        else:
-            print("\n⚠️  将清空所有数据，包括管理员配置！")
-        
+
         # 交互式选择：是否创建种子数据
         print("\n请选择是否创建种子数据：")
         print("1. 创建种子数据（仓库、品类、示例库存）")
         print("2. 不创建种子数据（仅清空数据）")
         seed_choice = input("\n请选择 (1/2，默认 1): ").strip()
         seed_data_flag = seed_choice != '2'
-        
-        if seed_data_flag:
-            print("\n📦 将重新初始化种子数据")
-        else:
-            print("\n📦 不会创建种子数据（仅清空现有数据）")
-        
-        # 确认操作
-        print("\n" + "=" * 80)
-        print("操作摘要：")
-        if keep_admin:
-            print("  - 管理员配置：保留")
-        else:
-            print("  - 管理员配置：清空")
-        if seed_data_flag:
-            print("  - 种子数据：创建")
-        else:
-            print("  - 种子数据：不创建")
-        print("=" * 80)
-        
+
+    if keep_admin:
+        print("\n✅ 将保留管理员配置（MFA 设置等）")
+    else:
+        print("\n⚠️  将清空所有数据，包括管理员配置！")
+    if seed_data_flag:
+        print("📦 将重新初始化种子数据")
+    else:
+        print("📦 不会创建种子数据（仅清空现有数据）")
+
+    # 确认操作
+    print("\n" + "=" * 80)
+    print("操作摘要：")
+    if keep_admin:
+        print("  - 管理员配置：保留")
+    else:
+        print("  - 管理员配置：清空")
+    if seed_data_flag:
+        print("  - 种子数据：创建")
+    else:
+        print("  - 种子数据：不创建")
+    print("=" * 80)
+
+    if not non_interactive:
         confirm = input("\n确认要重置数据库吗？(输入 'yes' 确认): ")
         if confirm.lower() != 'yes':
             print("操作已取消")
             return
-        
+
+    # 确认通过后才导入 ORM 并开会话：--help、取消或非 TTY 早退路径
+    # 不付 SQLAlchemy 映射构建与连接池初始化的启动开销
+    from sqlalchemy import text
+    from sqlalchemy.exc import ProgrammingError
+    from app.database import SessionLocal
+    from app.seed_data import seed_data
+
+    db = SessionLocal()
+
+    try:
         print("\n开始重置数据库...")
-        
-        # 按依赖顺序删除数据（避免外键约束错误）
-        # 注意：不使用 session_replication_role，因为需要特殊权限
-        # 直接按正确顺序删除即可
-        
-        print("1. 清空交易记录表...")
-        try:
-            db.execute(text("DELETE FROM transactions"))
-            print(f"   ✅ 已清空交易记录表")
-        except Exception as e:
-            db.rollback()
-            print(f"   ❌ 清空交易记录表时出错: {e}")
-            raise
-        
-        print("2. 清空库存物品表...")
-        try:
-            db.execute(text("DELETE FROM items"))
-            print(f"   ✅ 已清空库存物品表")
-        except Exception as e:
-            db.rollback()
-            print(f"   ❌ 清空库存物品表时出错: {e}")
-            raise
-        
-        print("3. 清空品类表...")
+
+        # 重置是可重跑操作：关闭同步提交，COMMIT 不再等待 WAL fsync 落盘
+        # （仅本会话生效，崩溃最多丢这次重置，重跑即可）
+        db.execute(text("SET synchronous_commit = off"))
+
+        # 单条 TRUNCATE 取代逐表 DELETE + 逐个序列重置：
+        # 页级回收代替逐行 MVCC 删除与逐行 WAL，CASCADE 处理外键顺序，
+        # RESTART IDENTITY 原子重置全部自增序列，~10 次往返合并为 1 次
+        tables = "transactions, items, categories, warehouses"
+        if not keep_admin:
+            tables += ", admin"
+
+        print("1. 清空数据表...")
         try:
-            db.execute(text("DELETE FROM categories"))
-            print(f"   ✅ 已清空品类表")
-        except Exception as e:
+            db.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+            print(f"   ✅ 已清空并重置序列: {tables}")
+        except ProgrammingError:
+            # 账号没有 TRUNCATE 权限时回退为 DELETE：
+            # 按依赖顺序拼成一条多语句串（psycopg2 支持）一次送出，
+            # 仍只占一次往返，而不是逐条语句各跑一个来回
             db.rollback()
-            print(f"   ❌ 清空品类表时出错: {e}")
-            raise
-        
-        print("4. 清空仓库表...")
-        try:
-            db.execute(text("DELETE FROM warehouses"))
-            print(f"   ✅ 已清空仓库表")
+            stmts = [
+                "DELETE FROM transactions",
+                "DELETE FROM items",
+                "DELETE FROM categories",
+                "DELETE FROM warehouses",
+            ]
+            sequences = [
+                "transactions_id_seq",
+                "items_id_seq",
+                "categories_id_seq",
+                "warehouses_id_seq",
+            ]
+            if not keep_admin:
+                stmts.append("DELETE FROM admin")
+                sequences.append("admin_id_seq")
+            stmts.extend(
+                f"ALTER SEQUENCE IF EXISTS {seq} RESTART WITH 1"
+                for seq in sequences
+            )
+            try:
+                db.execute(text(";\n".join(stmts)))
+                print(f"   ✅ 已清空并重置序列（DELETE 回退路径）: {tables}")
+            except Exception as e:
+                db.rollback()
+                print(f"   ❌ 清空数据表时出错: {e}")
+                raise
         except Exception as e:
             db.rollback()
-            print(f"   ❌ 清空仓库表时出错: {e}")
+            print(f"   ❌ 清空数据表时出错: {e}")
             raise
-        
+
         # 处理 admin 表
         if keep_admin:
-            print("5. 保留管理员配置...")
+            print("2. 保留管理员配置...")
             try:
-                admin_count = db.query(models.Admin).count()
+                # 文本 COUNT：跳过 ORM 的子查询包装，计划器直接数 admin 表
+                admin_count = db.execute(text("SELECT COUNT(*) FROM admin")).scalar()
                 if admin_count > 0:
                     print(f"   ✅ 保留 {admin_count} 条管理员记录")
                 else:
@@ -125,72 +154,33 @@ def reset_database(keep_admin: bool = False, seed_data_flag: bool = True):
                 db.rollback()
                 print(f"   ❌ 检查管理员表时出错: {e}")
                 raise
-        else:
-            print("5. 清空管理员表...")
-            try:
-                db.execute(text("DELETE FROM admin"))
-                print(f"   ✅ 已清空管理员表")
-            except Exception as e:
-                db.rollback()
-                print(f"   ❌ 清空管理员表时出错: {e}")
-                raise
-        
-        # 重置序列（PostgreSQL）
-        print("6. 重置自增序列...")
-        sequences = [
-            "categories_id_seq",
-            "warehouses_id_seq",
-            "items_id_seq",
-            "transactions_id_seq"
-        ]
-        if not keep_admin:
-            sequences.append("admin_id_seq")
-        
-        for seq_name in sequences:
-            try:
-                db.execute(text(f"ALTER SEQUENCE IF EXISTS {seq_name} RESTART WITH 1"))
-                print(f"   ✅ 已重置序列 {seq_name}")
-            except Exception as e:
-                # 序列重置失败不影响整体操作，只记录警告
-                print(f"   ⚠️  重置序列 {seq_name} 时出错（可忽略）: {e}")
-        
-        # 提交删除操作
+
+        # 重新初始化种子数据（复用同一会话，与清空同一事务）
+        if seed_data_flag:
+            print("\n3. 初始化种子数据...")
+            seed_data(db)
+
+        # 单次提交：清空与种子共用一次 WAL 刷写，要么都生效要么都回滚，
+        # 不存在"数据已清空但种子未建"的中间状态
         db.commit()
-        print("\n✅ 数据清空完成")
-        
-        # 重新初始化种子数据
+
+        print("\n" + "=" * 80)
+        print("✅ 数据库重置完成！")
+        print("=" * 80)
         if seed_data_flag:
-            print("\n7. 初始化种子数据...")
-            try:
-                seed_data()
-                print("\n" + "=" * 80)
-                print("✅ 数据库重置完成！")
-                print("=" * 80)
-                print("\n数据库已恢复到初始状态：")
-                print("  - 仓库：仓库 A, 仓库 B")
-                print("  - 品类：光纤跳线、网线、MPO主干光纤")
-                print("  - 库存：已创建示例库存数据")
-                if keep_admin:
-                    print("  - 管理员配置：已保留")
-                else:
-                    print("  - 管理员配置：已清空（需要重新设置）")
-                print("=" * 80)
-            except Exception as e:
-                print(f"\n⚠️  种子数据初始化失败: {e}")
-                print("数据已清空，但种子数据未创建")
-                raise
+            print("\n数据库已恢复到初始状态：")
+            print("  - 仓库：仓库 A, 仓库 B")
+            print("  - 品类：光纤跳线、网线、MPO主干光纤")
+            print("  - 库存：已创建示例库存数据")
         else:
-            print("\n" + "=" * 80)
-            print("✅ 数据库重置完成！")
-            print("=" * 80)
             print("\n所有数据已清空")
-            if keep_admin:
-                print("  - 管理员配置：已保留")
-            else:
-                print("  - 管理员配置：已清空（需要重新设置）")
             print("  - 种子数据：未创建")
-            print("=" * 80)
-        
+        if keep_admin:
+            print("  - 管理员配置：已保留")
+        else:
+            print("  - 管理员配置：已清空（需要重新设置）")
+        print("=" * 80)
+
     except Exception as e:
         db.rollback()
         print("\n" + "=" * 80)
@@ -204,8 +194,30 @@ def reset_database(keep_admin: bool = False, seed_data_flag: bool = True):
         db.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='数据库重置脚本')
+    parser.add_argument(
+        '--yes',
+        action='store_true',
+        help='跳过所有交互提示（脚本/CI 使用；stdin 非 TTY 时必须显式传入）'
+    )
+    parser.add_argument(
+        '--keep-admin',
+        action='store_true',
+        help='保留 admin 表数据（MFA 配置等），非交互模式下生效'
+    )
+    parser.add_argument(
+        '--no-seed',
+        action='store_true',
+        help='不创建种子数据，非交互模式下生效'
+    )
+    args = parser.parse_args()
+
     try:
-        reset_database()
+        reset_database(
+            keep_admin=args.keep_admin,
+            seed_data_flag=not args.no_seed,
+            yes=args.yes
+        )
     except KeyboardInterrupt:
         print("\n\n操作被用户中断")
         sys.exit(1)